@@ -28,9 +28,106 @@
 /////////////////////////////////////////////////////////////////////////
 """
 
-import os, sys, logging, traceback, codecs, datetime, copy, time, ast, math, re, random, shutil, json, csv, multiprocessing, subprocess
+import os, sys, logging, glob, ast
 import intel_viz_lib
 
+# note: networkx and matplotlib are only imported by the export, render and explore commands (inside intel_viz_lib) so index and query commands start quickly
+
+USAGE = """Usage:
+  intel_viz.py index <config_file> <data_graph> <index_file>
+  intel_viz.py query <config_file> <data_graph | index_file>
+  intel_viz.py estimate <config_file> <data_graph | index_file>
+  intel_viz.py export <config_file> <data_graph | index_file> <export_file>
+  intel_viz.py render <config_file> <data_graph | index_file>
+  intel_viz.py explore <config_file> <data_graph | index_file>
+  intel_viz.py path <config_file> <data_graph | index_file> <entity_from> <entity_to>
+  intel_viz.py associates <config_file> <data_graph | index_file> [<entity>]
+  intel_viz.py <config_file> <data_graph> [<export_file>]
+
+<data_graph> can be a file, a directory or a glob pattern of data graph files. <index_file> must end with .index.json
+<export_file> format is set by its extension (.graphml, .gexf or .json)
+<entity_from>, <entity_to> and <entity> are entities in the index e.g. NER-PERSON:Diane (associates uses the root nodes if no entity is given)"""
+
+def load_index( str_data_graph, dict_config ) :
+	"""
+	load a cached index file (made by the index command) or index a data graph
+
+	:param str str_data_graph: index file (ending .index.json) or data graph file, directory or glob pattern
+	:param dict dict_config: config object
+	:return: entity index, root node list
+	:rtype: dict, list
+	"""
+
+	if str_data_graph.endswith('.index.json') :
+		dict_config['logger'].info('index_file: ' + repr(str_data_graph) )
+		return intel_viz_lib.read_entity_index(
+			filename = str_data_graph,
+			dict_config = dict_config )
+
+	dict_config['logger'].info('data_graph: ' + repr(str_data_graph) )
+	return intel_viz_lib.load_data_graph(
+		data_graph_file = str_data_graph,
+		dict_config = dict_config )
+
+def print_query( dict_query ) :
+	"""
+	print the neighbourhood stats for each root node to STDOUT
+
+	:param dict dict_query: result of intel_viz_lib.query_data_graph()
+	"""
+
+	for strRootNode in dict_query :
+		dictStats = dict_query[strRootNode]
+		print( strRootNode )
+		print( '  nodes = ' + str(dictStats['nodes']) + ', edges = ' + str(dictStats['edges']) )
+		for strCategory in sorted( dictStats['categories'] ) :
+			print( '  ' + strCategory + ' = ' + str(dictStats['categories'][strCategory]) )
+		print( '  top connected :' )
+		for ( strEntity, nFreq ) in dictStats['top_connected'] :
+			print( '    ' + strEntity + ' (' + str(nFreq) + ')' )
+	sys.stdout.flush()
+
+def print_estimate( list_estimate ) :
+	"""
+	print the estimated graph size for each search depth to STDOUT
+
+	:param list list_estimate: result of intel_viz_lib.estimate_graph_size()
+	"""
+
+	for dictEstimate in list_estimate :
+		print( 'search_depth = ' + str(dictEstimate['search_depth']) + ' : nodes ~ ' + str(dictEstimate['nodes']) + ', edges ~ ' + str(dictEstimate['edges']) )
+	sys.stdout.flush()
+
+def print_paths( list_paths ) :
+	"""
+	print connecting paths to STDOUT
+
+	:param list list_paths: result of intel_viz_lib.shortest_paths()
+	"""
+
+	if len(list_paths) == 0 :
+		print( 'no connection found' )
+
+	for ( listPath, listFreq ) in list_paths :
+		strPath = listPath[0]
+		for nIndex in range( len(listFreq) ) :
+			strPath = strPath + ' -(' + str(listFreq[nIndex]) + ')- ' + listPath[nIndex+1]
+		print( strPath )
+	sys.stdout.flush()
+
+def print_associates( dict_associates ) :
+	"""
+	print the top associated entities for each entity to STDOUT
+
+	:param dict dict_associates: dict of entity -> result of intel_viz_lib.top_associated_entities()
+	"""
+
+	for strEntity in dict_associates :
+		print( strEntity )
+		for ( strEntityAssociated, nStrength ) in dict_associates[strEntity] :
+			print( '  ' + strEntityAssociated + ' (' + str(nStrength) + ')' )
+	sys.stdout.flush()
+
 
 ################################
 # main
@@ -42,8 +139,21 @@ if __name__ == '__main__' :
 	#
 	# check args
 	#
-	if len(sys.argv) < 3 :
-		print('Usage: intel_viz_lib.py <config_file> <data_graph>')
+	listArgs = sys.argv[1:]
+	strCommand = None
+	if (len(listArgs) > 0) and (listArgs[0] in [ 'index', 'query', 'estimate', 'export', 'render', 'explore', 'path', 'associates' ]) :
+		strCommand = listArgs[0]
+		listArgs = listArgs[1:]
+	elif len(listArgs) == 3 :
+		# original command line with an export file
+		strCommand = 'export'
+	elif len(listArgs) == 2 :
+		# original command line
+		strCommand = 'render'
+
+	dictArgCount = { 'index' : [3], 'query' : [2], 'estimate' : [2], 'export' : [3], 'render' : [2], 'explore' : [2], 'path' : [4], 'associates' : [2,3] }
+	if (strCommand == None) or (not len(listArgs) in dictArgCount[strCommand]) :
+		print( USAGE )
 		sys.stdout.flush()
 		sys.exit(1)
 
@@ -55,33 +165,138 @@ if __name__ == '__main__' :
 
 	try :
 		# init
-		strConfigFile = sys.argv[1]
+		strConfigFile = listArgs[0]
 		if not os.path.isfile(strConfigFile) :
 			print('<config_file> ' + strConfigFile + ' does not exist\n')
 			sys.stdout.flush()
 			sys.exit(1)
 
-		strDataGraphFile = sys.argv[2]
-		if not os.path.isfile(strDataGraphFile) :
+		# data graph can be a file, a directory of files or a glob pattern
+		strDataGraphFile = listArgs[1]
+		if (not os.path.exists(strDataGraphFile)) and (len(glob.glob(strDataGraphFile)) == 0) :
 			print('<data_graph> ' + strDataGraphFile + ' does not exist\n')
 			sys.stdout.flush()
 			sys.exit(1)
 
-		logger.info('data_graph: ' + repr(strDataGraphFile) )
+		logger.info('command: ' + strCommand )
 
 		# load config
 		logger.info('config_file: ' + repr(strConfigFile) )
 		dictAppConfig = intel_viz_lib.read_config( strConfigFile )
 		dictAppConfig['logger'] = logger
 
-		dictEntityIndex, listRootNodes = intel_viz_lib.load_data_graph(
-			data_graph_file = strDataGraphFile,
-			dict_config = dictAppConfig )
+		# optional persistent label cache (so pseudonymized labels are stable across runs)
+		if 'label_cache_file' in dictAppConfig :
+			intel_viz_lib.read_label_cache(
+				filename = dictAppConfig['label_cache_file'],
+				dict_config = dictAppConfig )
+
+		if strCommand == 'index' :
+			strIndexFile = listArgs[2]
+			if not strIndexFile.endswith('.index.json') :
+				print('<index_file> ' + strIndexFile + ' must end with .index.json\n')
+				sys.stdout.flush()
+				sys.exit(1)
+
+			dictEntityIndex, listRootNodes = intel_viz_lib.load_data_graph(
+				data_graph_file = strDataGraphFile,
+				dict_config = dictAppConfig )
+
+			intel_viz_lib.write_entity_index(
+				filename = strIndexFile,
+				entity_index = dictEntityIndex,
+				list_root_nodes = listRootNodes,
+				dict_config = dictAppConfig )
+
+			logger.info('index_file: ' + repr(strIndexFile) )
+
+		else :
+			dictEntityIndex, listRootNodes = load_index( strDataGraphFile, dictAppConfig )
+
+			if strCommand == 'query' :
+				dictQuery = intel_viz_lib.query_data_graph(
+					list_root_nodes = listRootNodes,
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig )
+				print_query( dictQuery )
+
+			elif strCommand == 'estimate' :
+				listEstimate = intel_viz_lib.estimate_graph_size(
+					list_root_nodes = listRootNodes,
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig )
+				print_estimate( listEstimate )
+
+			elif strCommand == 'path' :
+				nMaxPaths = 5
+				if 'max_paths' in dictAppConfig :
+					nMaxPaths = int( dictAppConfig['max_paths'] )
+				nMaxHops = None
+				if 'max_path_hops' in dictAppConfig :
+					nMaxHops = ast.literal_eval( dictAppConfig['max_path_hops'] )
+
+				listPaths = intel_viz_lib.shortest_paths(
+					entity_from = listArgs[2],
+					entity_to = listArgs[3],
+					entity_index = dictEntityIndex,
+					list_direction = dictAppConfig['list_direction'],
+					max_paths = nMaxPaths,
+					max_hops = nMaxHops )
+				print_paths( listPaths )
+
+			elif strCommand == 'associates' :
+				nTopK = 20
+				if 'top_associates' in dictAppConfig :
+					nTopK = int( dictAppConfig['top_associates'] )
+				listCategories = None
+				if 'associate_categories' in dictAppConfig :
+					listCategories = dictAppConfig['associate_categories']
+					if isinstance( listCategories, str ) :
+						listCategories = ast.literal_eval( listCategories )
+
+				listEntities = listRootNodes
+				if len(listArgs) > 2 :
+					listEntities = [ listArgs[2] ]
+
+				dictEngine = intel_viz_lib.build_comention_engine(
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig )
+
+				dictAssociates = {}
+				for strEntity in listEntities :
+					dictAssociates[strEntity] = intel_viz_lib.top_associated_entities(
+						entity = strEntity,
+						engine = dictEngine,
+						top_k = nTopK,
+						list_categories = listCategories )
+				print_associates( dictAssociates )
+
+			elif strCommand == 'export' :
+				strExportFile = listArgs[2]
+				logger.info('export_file: ' + repr(strExportFile) )
+
+				intel_viz_lib.export_data_graph(
+					list_root_nodes = listRootNodes,
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig,
+					export_file = strExportFile )
+
+			elif strCommand == 'explore' :
+				intel_viz_lib.explore_data_graph(
+					list_root_nodes = listRootNodes,
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig )
+
+			else :
+				intel_viz_lib.viz_data_graph(
+					list_root_nodes = listRootNodes,
+					entity_index = dictEntityIndex,
+					dict_config = dictAppConfig )
 
-		intel_viz_lib.viz_data_graph(
-			list_root_nodes = listRootNodes,
-			entity_index = dictEntityIndex,
-			dict_config = dictAppConfig )
+		if 'label_cache_file' in dictAppConfig :
+			intel_viz_lib.write_label_cache(
+				filename = dictAppConfig['label_cache_file'],
+				dict_config = dictAppConfig )
 
 	except :
 		logger.exception( 'intel_viz main() exception' )
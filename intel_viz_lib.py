@@ -28,9 +28,9 @@
 /////////////////////////////////////////////////////////////////////////
 """
 
-import os, sys, logging, traceback, codecs, datetime, copy, time, ast, math, re, random, shutil, json, csv, multiprocessing, subprocess, configparser, hashlib
-import networkx as nx
-import matplotlib.pyplot as plt
+import os, sys, logging, traceback, codecs, datetime, copy, time, ast, math, re, random, shutil, json, csv, multiprocessing, subprocess, configparser, hashlib, glob, heapq, base64
+
+# note: networkx and matplotlib are imported only by the functions that build, export or draw graphs, so indexing and queries start quickly
 
 def read_config( filename, logger = None ) :
 	"""
@@ -72,7 +72,7 @@ def load_data_graph( data_graph_file = None, dict_config = None ) :
 	"""
 	load data graph, cluster and index all entities within it ready for visualization
 
-	:param str data_graph_file: filename of data graph (JSON formatted)
+	:param str data_graph_file: filename of data graph (JSON formatted), a directory of data graph files, a glob pattern (e.g. crawl/siteA_*.json) or a list of these
 	:param dict dict_config: config object containing root node spec and filters
 	:return: entity index, root node list
 	:rtype: dict, list
@@ -80,13 +80,19 @@ def load_data_graph( data_graph_file = None, dict_config = None ) :
 
 	if not isinstance( dict_config, dict) :
 		raise Exception( 'dict_config invalid : ' + repr(dict_config) )
-	if not isinstance( data_graph_file, str) :
+	if (not isinstance( data_graph_file, str)) and (not isinstance( data_graph_file, list)) :
 		raise Exception( 'data graph data_graph_file invalid : ' + repr(data_graph_file) )
-	if not os.path.exists( data_graph_file ):
+
+	listDataGraphFiles = generate_data_graph_file_list(
+		data_graph_file = data_graph_file,
+		dict_config = dict_config )
+	if len(listDataGraphFiles) == 0 :
 		raise Exception( 'data graph filename does not exist : ' + repr(data_graph_file) )
 
+	dict_config['logger'].info( 'data graph files # ' + str(len(listDataGraphFiles)) )
+
 	dictEntityIndex = index_intel_data(
-		file_json = data_graph_file,
+		file_json = listDataGraphFiles,
 		dict_config = dict_config )
 
 	dict_config['logger'].info( 'index entities (source) # ' + str(len(dictEntityIndex)) )
@@ -101,6 +107,19 @@ def load_data_graph( data_graph_file = None, dict_config = None ) :
 
 	#dict_config['logger'].info('T2 = ' + json.dumps(listRootNodes_initial,indent=True) )
 
+	# targeted load (only cluster and filter the part of the index that can be reached from the root nodes)
+	bTargetedLoad = False
+	if 'targeted_load' in dict_config :
+		bTargetedLoad = ast.literal_eval( dict_config['targeted_load'] )
+
+	if bTargetedLoad == True :
+		dictEntityIndex = generate_neighbourhood_index(
+			entity_index = dictEntityIndex,
+			list_root_nodes = listRootNodes_initial,
+			dict_config = dict_config )
+
+		dict_config['logger'].info( 'index entities (root neighbourhood) # ' + str(len(dictEntityIndex)) )
+
 	dictClusteredEntityIndex = cluster_index(
 		entity_index = dictEntityIndex,
 		list_root_nodes = listRootNodes_initial,
@@ -132,6 +151,552 @@ def load_data_graph( data_graph_file = None, dict_config = None ) :
 
 	return dictFilteredEntityIndex, listRootNodes_cluster
 
+def generate_neighbourhood_index( entity_index = None, list_root_nodes = None, dict_config = None ) :
+	"""
+	reduce an entity index to the part that is reachable from the root nodes within search_depth hops (using list_direction), so clustering,
+	filtering and graph walks only process the root neighbourhood. entities that would be aggregated into the same cluster by cluster_spec are
+	treated as a single node, and clusters matching root_node_spec are treated as extra roots. filtering can only remove connections so it is ignored.
+	reachable entities keep all their connections, so entity_freq_range patterns and the final graph are the same as for the full index.
+
+	:param dict entity_index: index created by index_intel_data()
+	:param list list_root_nodes: list of root nodes (before clustering)
+	:param dict dict_config: config object
+	:return: entity index of the root neighbourhood
+	:rtype: dict
+	"""
+
+	search_depth = int( dict_config['search_depth'] )
+	list_direction = dict_config['list_direction']
+
+	setRootNodes = set( list_root_nodes )
+
+	# entities aggregated into the same cluster (clusters whose pattern matches another cluster ID are merged as it might be aggregated into it)
+	listClusterIDs = list( dict_config['cluster_spec'].keys() )
+	dictClusterGroup = {}
+	for strClusterID in listClusterIDs :
+		listClusterEntities = entity_lookup_using_filter(
+			entity_index = entity_index,
+			filter_spec = dict_config['cluster_spec'][strClusterID] )
+
+		setGroup = set([])
+		for strEntity in listClusterEntities :
+			if not strEntity in setRootNodes :
+				setGroup.add( strEntity )
+		for strClusterIDOther in entity_lookup_using_entity_names(
+				list_entity = listClusterIDs,
+				filter_spec = dict_config['cluster_spec'][strClusterID] ) :
+			if strClusterIDOther != strClusterID :
+				setGroup.add( strClusterIDOther )
+		dictClusterGroup[strClusterID] = setGroup
+
+	dictEntityGroup = {}
+	for strClusterID in listClusterIDs :
+		setGroup = dictClusterGroup[strClusterID]
+		setGroup.add( strClusterID )
+		for strEntity in list( setGroup ) :
+			if (strEntity in dictEntityGroup) and (not dictEntityGroup[strEntity] is setGroup) :
+				# merge overlapping groups
+				setOther = dictEntityGroup[strEntity]
+				setGroup.update( setOther )
+				for strEntityOther in setOther :
+					dictEntityGroup[strEntityOther] = setGroup
+			dictEntityGroup[strEntity] = setGroup
+
+	# root nodes, plus members of any clusters that could become root nodes after clustering
+	listSeeds = list( list_root_nodes )
+	for strClusterID in entity_lookup_using_entity_names(
+			list_entity = listClusterIDs,
+			filter_spec = dict_config['root_node_spec'] ) :
+		listSeeds.append( strClusterID )
+
+	# reverse connections for backward graph walks
+	dictReverseIndex = {}
+	if 'backward' in list_direction :
+		dictReverseIndex = generate_reverse_index( entity_index = entity_index )
+
+	# depth limited walk of the index
+	setVisited = set([])
+	listFrontier = []
+	for strEntity in listSeeds :
+		listAdd = [ strEntity ]
+		if strEntity in dictEntityGroup :
+			listAdd = dictEntityGroup[strEntity]
+		for strEntityAdd in listAdd :
+			if not strEntityAdd in setVisited :
+				setVisited.add( strEntityAdd )
+				listFrontier.append( strEntityAdd )
+
+	for nLevel in range( search_depth ) :
+		listFrontierNext = []
+		for strEntity in listFrontier :
+			listLinked = []
+			if ('forward' in list_direction) and (strEntity in entity_index) :
+				listLinked.extend( entity_index[strEntity].keys() )
+			if strEntity in dictReverseIndex :
+				listLinked.extend( dictReverseIndex[strEntity] )
+
+			for strEntityLinked in listLinked :
+				if strEntityLinked in setVisited :
+					continue
+				listAdd = [ strEntityLinked ]
+				if strEntityLinked in dictEntityGroup :
+					listAdd = dictEntityGroup[strEntityLinked]
+				for strEntityAdd in listAdd :
+					if not strEntityAdd in setVisited :
+						setVisited.add( strEntityAdd )
+						listFrontierNext.append( strEntityAdd )
+		listFrontier = listFrontierNext
+
+	# keep index order so the final graph is identical to one made from the full index
+	dictNeighbourhoodIndex = {}
+	for strEntity in entity_index :
+		if strEntity in setVisited :
+			dictNeighbourhoodIndex[strEntity] = entity_index[strEntity]
+
+	return dictNeighbourhoodIndex
+
+def query_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None, top_n = 10 ) :
+	"""
+	summarize the search_depth neighbourhood of each root node without building a networkx graph (before aggregation and max_nodes pruning).
+	search_depth can be lowered by the pre-flight size check (see preflight_graph_size()).
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object
+	:param int top_n: number of directly connected entities to report for each root node
+	:return: dict of root node -> { 'nodes' : int, 'edges' : int, 'categories' : { category : count }, 'top_connected' : [ (entity, freq), ... ] }
+	:rtype: dict
+	"""
+
+	search_depth = preflight_graph_size(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config )
+	list_direction = dict_config['list_direction']
+
+	# sparse traversal walks all root nodes over one adjacency engine
+	dictReachable = None
+	if ('traversal' in dict_config) and (dict_config['traversal'] == 'sparse') :
+		dictEngine = build_adjacency_engine(
+			entity_index = entity_index,
+			list_direction = list_direction,
+			sparse_matrix = False )
+		dictReachable = batch_reachability(
+			list_root_nodes = list_root_nodes,
+			engine = dictEngine,
+			search_depth = search_depth )
+
+	dictResult = {}
+	for strRootNode in list_root_nodes :
+		if dictReachable != None :
+			listEBunch = dictReachable[strRootNode][1]
+		else :
+			listEBunch = bfs_edges(
+				strRootNode,
+				entity_index,
+				search_depth = search_depth,
+				list_direction = list_direction )
+
+		setNodes = set([ strRootNode ])
+		setEdges = set([])
+		for ( strEntity1, strEntity2, nWeight ) in listEBunch :
+			setNodes.add( strEntity1 )
+			setNodes.add( strEntity2 )
+			if strEntity1 != strEntity2 :
+				setEdges.add( frozenset( [ strEntity1, strEntity2 ] ) )
+
+		dictCategories = {}
+		for strEntity in setNodes :
+			strCategory = 'root'
+			if strEntity != strRootNode :
+				strCategory = classify_entity(
+					entity = strEntity,
+					dict_config = dict_config )
+			if not strCategory in dictCategories :
+				dictCategories[strCategory] = 0
+			dictCategories[strCategory] += 1
+
+		# directly connected entities ranked by connection freq in the index
+		dictConnected = {}
+		if strRootNode in entity_index :
+			if 'forward' in list_direction :
+				for strEntityLinked in entity_index[strRootNode] :
+					dictConnected[strEntityLinked] = dictConnected.get( strEntityLinked, 0 ) + entity_index[strRootNode][strEntityLinked]
+			if 'backward' in list_direction :
+				for strEntityLinked in entity_index :
+					if strRootNode in entity_index[strEntityLinked] :
+						dictConnected[strEntityLinked] = dictConnected.get( strEntityLinked, 0 ) + entity_index[strEntityLinked][strRootNode]
+		listConnected = sorted( dictConnected.items(), key=lambda entry: entry[1], reverse=True )
+
+		dictResult[strRootNode] = {
+			'nodes' : len(setNodes),
+			'edges' : len(setEdges),
+			'categories' : dictCategories,
+			'top_connected' : listConnected[:top_n],
+			}
+
+	return dictResult
+
+def estimate_graph_size( list_root_nodes = [], entity_index = {}, dict_config = None, search_depth = None ) :
+	"""
+	estimate the number of nodes and edges a bfs() graph walk from the root nodes would find (before aggregation and max_nodes pruning), for each depth up to search_depth.
+	no graph walk is done, the estimate is a union of the reach sketches (see build_reach_sketch()) of the root nodes. needs numpy and scipy.
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object
+	:param int search_depth: max depth to estimate (None to use search_depth in the config)
+	:return: list of { 'search_depth' : int, 'nodes' : int, 'edges' : int } for depth 1 .. search_depth
+	:rtype: list
+	"""
+
+	import numpy
+
+	if search_depth == None :
+		search_depth = int( dict_config['search_depth'] )
+
+	dictSketch = get_reach_sketch(
+		entity_index = entity_index,
+		dict_config = dict_config,
+		search_depth = search_depth )
+
+	# roots without any connections are not part of the graph (same as bfs)
+	listRows = []
+	for strRootNode in set( list_root_nodes ) :
+		if strRootNode in dictSketch['entity_pos'] :
+			nPos = dictSketch['entity_pos'][strRootNode]
+			if numpy.any( dictSketch['edges'][0][nPos] ) :
+				listRows.append( nPos )
+
+	listResult = []
+	for nDepth in range( 1, search_depth + 1 ) :
+		nNodes = 0
+		nEdges = 0
+		if len(listRows) > 0 :
+			nNodes = count_sketch( numpy.max( dictSketch['nodes'][nDepth-1][listRows], axis=0 ) )
+			nEdges = count_sketch( numpy.max( dictSketch['edges'][nDepth-1][listRows], axis=0 ) )
+		listResult.append( {
+			'search_depth' : nDepth,
+			'nodes' : nNodes,
+			'edges' : nEdges,
+			} )
+
+	return listResult
+
+def get_reach_sketch( entity_index = None, dict_config = None, search_depth = None ) :
+	"""
+	get the reach sketch for the entity index, making it if the config does not have one for this entity index (checked with fingerprint_entity_index()), list_direction and search_depth.
+	the sketch is stored in dict_config['reach_sketch'] (and saved to index files by write_entity_index()).
+
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object
+	:param int search_depth: max depth needed
+	:return: reach sketch created by build_reach_sketch()
+	:rtype: dict
+	"""
+
+	list_direction = dict_config['list_direction']
+	strFingerprint = fingerprint_entity_index( entity_index = entity_index )
+
+	if 'reach_sketch' in dict_config :
+		dictSketch = dict_config['reach_sketch']
+		if dictSketch.get( 'fingerprint' ) != strFingerprint :
+			dict_config['logger'].info( 'reach sketch was made for a different entity index, rebuilding it' )
+		elif (dictSketch['direction'] == sorted( list_direction )) and (dictSketch['depth'] >= search_depth) :
+			return dictSketch
+
+	dict_config['logger'].info( 'making reach sketch (search_depth = ' + str(max( search_depth, 2 )) + ')' )
+	dict_config['reach_sketch'] = build_reach_sketch(
+		entity_index = entity_index,
+		list_direction = list_direction,
+		search_depth = max( search_depth, 2 ) )
+	dict_config['reach_sketch']['fingerprint'] = strFingerprint
+
+	return dict_config['reach_sketch']
+
+def fingerprint_entity_index( entity_index = None ) :
+	"""
+	internal function to make a fingerprint of the content of an entity index (each entity with its number of links and total link freq), so a reach sketch
+	made for one index is not used for another (e.g. a re-indexed corpus with the same number of entities)
+
+	:param dict entity_index: entity index created by load_data_graph()
+	:return: hex SHA-1 digest
+	:rtype: str
+	"""
+
+	hashFingerprint = hashlib.sha1()
+	for strEntity in sorted( entity_index ) :
+		nFreq = 0
+		for strEntityLinked in entity_index[strEntity] :
+			nFreq = nFreq + entity_index[strEntity][strEntityLinked]
+		hashFingerprint.update( ( strEntity + '\t' + str(len( entity_index[strEntity] )) + '\t' + str(nFreq) + '\n' ).encode('utf-8') )
+
+	return hashFingerprint.hexdigest()
+
+def preflight_graph_size( list_root_nodes = [], entity_index = {}, dict_config = None ) :
+	"""
+	check the estimated graph size (see estimate_graph_size()) before a graph walk, if preflight_max_nodes is set in the config.
+	if the estimated node count exceeds preflight_max_nodes then preflight_action decides what happens: warn (log a warning), abort (raise an exception)
+	or tighten (use the largest search_depth that fits, min 1).
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object
+	:return: search_depth to use
+	:rtype: int
+	"""
+
+	search_depth = int( dict_config['search_depth'] )
+
+	max_nodes = None
+	if 'preflight_max_nodes' in dict_config :
+		max_nodes = ast.literal_eval( dict_config['preflight_max_nodes'] )
+	if (max_nodes == None) or (search_depth < 1) :
+		return search_depth
+
+	strAction = 'warn'
+	if 'preflight_action' in dict_config :
+		strAction = dict_config['preflight_action']
+	if not strAction in [ 'warn', 'abort', 'tighten' ] :
+		raise Exception( 'unknown preflight_action : ' + repr(strAction) )
+
+	listEstimate = estimate_graph_size(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config,
+		search_depth = search_depth )
+
+	dictEstimate = listEstimate[-1]
+	strEstimate = 'estimated graph size (search_depth = ' + str(search_depth) + ') nodes ~ ' + str(dictEstimate['nodes']) + ', edges ~ ' + str(dictEstimate['edges'])
+	dict_config['logger'].info( strEstimate )
+
+	if dictEstimate['nodes'] <= max_nodes :
+		return search_depth
+
+	if strAction == 'abort' :
+		raise Exception( strEstimate + ' exceeds preflight_max_nodes = ' + str(max_nodes) )
+
+	if strAction == 'warn' :
+		dict_config['logger'].warning( strEstimate + ' exceeds preflight_max_nodes = ' + str(max_nodes) )
+		return search_depth
+
+	nDepth = 1
+	for dictEstimate in listEstimate :
+		if dictEstimate['nodes'] <= max_nodes :
+			nDepth = dictEstimate['search_depth']
+	dict_config['logger'].warning( strEstimate + ' exceeds preflight_max_nodes = ' + str(max_nodes) + ' so using search_depth = ' + str(nDepth) )
+
+	return nDepth
+
+def build_comention_engine( entity_index = None, dict_config = None ) :
+	"""
+	build a sparse post/thread -> entity incidence matrix (SciPy CSR) from the entity index for co-mention analysis with top_associated_entities().
+	rows are post and thread contexts, columns are entities mentioned in them (with the mention freq) plus entities that connect to them (e.g. the post author).
+	needs numpy and scipy.
+
+	:param dict entity_index: index created by load_data_graph()
+	:param dict dict_config: config object (entity_prefix_map is used to categorize entities)
+	:return: co-mention engine { 'matrix' : contexts x entities CSR matrix, 'matrix_t' : entities x contexts CSR matrix, 'entities' : list, 'entity_pos' : dict, 'categories' : numpy array }
+	:rtype: dict
+	"""
+
+	import numpy
+	import scipy.sparse
+
+	tupleContextPrefix = ( 'posts[', 'thread[' )
+
+	dictContextPos = {}
+	dictEntityPos = {}
+	listEntities = []
+	listRows = []
+	listCols = []
+	listValues = []
+
+	for strEntity in entity_index :
+		bContext = strEntity.startswith( tupleContextPrefix )
+
+		for strEntityLinked in entity_index[strEntity] :
+			bContextLinked = strEntityLinked.startswith( tupleContextPrefix )
+
+			# context -> mentioned entity, or entity -> context (e.g. author -> post)
+			if (bContext == True) and (bContextLinked == False) :
+				strContext = strEntity
+				strColumn = strEntityLinked
+			elif (bContext == False) and (bContextLinked == True) :
+				strContext = strEntityLinked
+				strColumn = strEntity
+			else :
+				continue
+
+			if not strContext in dictContextPos :
+				dictContextPos[strContext] = len(dictContextPos)
+			if not strColumn in dictEntityPos :
+				dictEntityPos[strColumn] = len(listEntities)
+				listEntities.append( strColumn )
+
+			listRows.append( dictContextPos[strContext] )
+			listCols.append( dictEntityPos[strColumn] )
+			listValues.append( entity_index[strEntity][strEntityLinked] )
+
+	# duplicate (row, col) entries are summed
+	matrixIncidence = scipy.sparse.coo_matrix(
+		( numpy.array( listValues, dtype=numpy.float64 ), ( numpy.array( listRows, dtype=numpy.int64 ), numpy.array( listCols, dtype=numpy.int64 ) ) ),
+		shape = ( len(dictContextPos), len(listEntities) ) ).tocsr()
+
+	listCategories = []
+	for strEntity in listEntities :
+		listCategories.append( classify_entity(
+			entity = strEntity,
+			dict_config = dict_config ) )
+
+	return {
+		'matrix' : matrixIncidence,
+		'matrix_t' : matrixIncidence.transpose().tocsr(),
+		'entities' : listEntities,
+		'entity_pos' : dictEntityPos,
+		'categories' : numpy.array( listCategories, dtype=object ),
+		}
+
+def top_associated_entities( entity = None, engine = None, top_k = 20, list_categories = None ) :
+	"""
+	rank the entities that are mentioned in the same posts and threads as an entity. the co-mention strength of two entities is the sum over
+	all post and thread contexts of the product of their freq in that context (one row of the entity x entity co-mention matrix, computed on demand).
+
+	:param str entity: entity to find associates for (e.g. a root node)
+	:param dict engine: co-mention engine created by build_comention_engine()
+	:param int top_k: number of entities to return
+	:param list list_categories: optional list of categories (from entity_prefix_map, or unknown) to return. None for any category.
+	:return: list of (entity, co-mention strength) strongest first
+	:rtype: list
+	"""
+
+	import numpy
+
+	if not entity in engine['entity_pos'] :
+		return []
+
+	nPos = engine['entity_pos'][entity]
+
+	# (1 x contexts) * (contexts x entities) -> sparse row of co-mention strengths
+	vecStrength = engine['matrix_t'][nPos] @ engine['matrix']
+	vecStrength = vecStrength.tocsr()
+	arrayIndices = vecStrength.indices
+	arrayValues = vecStrength.data
+
+	arrayKeep = (arrayIndices != nPos) & (arrayValues > 0)
+	if list_categories != None :
+		arrayKeep = arrayKeep & numpy.isin( engine['categories'][arrayIndices], list_categories )
+	arrayIndices = arrayIndices[arrayKeep]
+	arrayValues = arrayValues[arrayKeep]
+
+	# top K (argpartition then sort only the top K)
+	if len(arrayValues) > top_k :
+		arrayTop = numpy.argpartition( -arrayValues, top_k - 1 )[:top_k]
+	else :
+		arrayTop = numpy.arange( len(arrayValues) )
+	arrayTop = arrayTop[ numpy.argsort( -arrayValues[arrayTop], kind='stable' ) ]
+
+	listResult = []
+	for nIndex in arrayTop :
+		listResult.append( ( engine['entities'][ arrayIndices[nIndex] ], int( arrayValues[nIndex] ) ) )
+
+	return listResult
+
+def write_entity_index( filename = None, entity_index = None, list_root_nodes = None, dict_config = None ) :
+	"""
+	save an entity index and root node list created by load_data_graph() to disk (JSON formatted), so later runs do not need to index, cluster and filter the data graph again.
+	the config settings used to make the index are saved with it, and reach sketches for the pre-flight graph size check if preflight_max_nodes is set.
+
+	:param str filename: index filename
+	:param dict entity_index: entity index created by load_data_graph()
+	:param list list_root_nodes: root node list created by load_data_graph()
+	:param dict dict_config: config object
+	"""
+
+	dictIndexFile = {
+		'config' : generate_index_settings( dict_config = dict_config ),
+		'root_nodes' : list_root_nodes,
+		'entity_index' : entity_index,
+		}
+
+	# reach sketches for the pre-flight graph size check are made at index time
+	if ('preflight_max_nodes' in dict_config) and (ast.literal_eval( dict_config['preflight_max_nodes'] ) != None) :
+		dictSketch = get_reach_sketch(
+			entity_index = entity_index,
+			dict_config = dict_config,
+			search_depth = int( dict_config['search_depth'] ) )
+		dictIndexFile['reach_sketch'] = {
+			'direction' : dictSketch['direction'],
+			'depth' : dictSketch['depth'],
+			'precision' : dictSketch['precision'],
+			'fingerprint' : dictSketch['fingerprint'],
+			'nodes' : [ base64.b64encode( arraySketch.tobytes() ).decode('ascii') for arraySketch in dictSketch['nodes'] ],
+			'edges' : [ base64.b64encode( arraySketch.tobytes() ).decode('ascii') for arraySketch in dictSketch['edges'] ],
+			}
+
+	writeHandle = codecs.open( filename=filename, mode='w', encoding='utf-8' )
+	json.dump( dictIndexFile, writeHandle, ensure_ascii=False, separators=(',',':') )
+	writeHandle.close()
+
+def read_entity_index( filename = None, dict_config = None ) :
+	"""
+	load an entity index and root node list saved by write_entity_index(). the index must have been made with the same root node spec, cluster spec and filter spec as the config.
+
+	:param str filename: index filename
+	:param dict dict_config: config object
+	:return: entity index, root node list
+	:rtype: dict, list
+	"""
+
+	readHandle = codecs.open( filename=filename, mode='r', encoding='utf-8' )
+	dictIndexFile = json.load( readHandle )
+	readHandle.close()
+
+	if dictIndexFile['config'] != generate_index_settings( dict_config = dict_config ) :
+		raise Exception( 'index file was made with a different config (root, cluster, filter or ingest settings) : ' + repr(filename) )
+
+	if 'reach_sketch' in dictIndexFile :
+		import numpy
+
+		dictSketch = dictIndexFile['reach_sketch']
+		nRegisters = 1 << dictSketch['precision']
+		dictEntityPos = {}
+		for strEntity in dictIndexFile['entity_index'] :
+			dictEntityPos[strEntity] = len(dictEntityPos)
+
+		dict_config['reach_sketch'] = {
+			'direction' : dictSketch['direction'],
+			'depth' : dictSketch['depth'],
+			'precision' : dictSketch['precision'],
+			'fingerprint' : dictSketch.get( 'fingerprint' ),
+			'entity_pos' : dictEntityPos,
+			'nodes' : [ numpy.frombuffer( base64.b64decode( strSketch ), dtype=numpy.uint8 ).reshape( -1, nRegisters ) for strSketch in dictSketch['nodes'] ],
+			'edges' : [ numpy.frombuffer( base64.b64decode( strSketch ), dtype=numpy.uint8 ).reshape( -1, nRegisters ) for strSketch in dictSketch['edges'] ],
+			}
+
+	return dictIndexFile['entity_index'], dictIndexFile['root_nodes']
+
+def generate_index_settings( dict_config = None ) :
+	"""
+	internal function to get the config settings that change the result of load_data_graph() (JSON serializable)
+
+	:param dict dict_config: config object
+	:return: config settings
+	:rtype: dict
+	"""
+
+	listKeys = [ 'root_node_spec', 'cluster_spec', 'filter_spec', 'exclude_sites', 'targeted_load' ]
+	if ('targeted_load' in dict_config) and (ast.literal_eval( dict_config['targeted_load'] ) == True) :
+		listKeys.extend( [ 'search_depth', 'list_direction' ] )
+
+	dictSettings = {}
+	for strKey in listKeys :
+		if strKey in dict_config :
+			dictSettings[strKey] = dict_config[strKey]
+
+	# round trip via JSON so it can be compared with a loaded index file
+	return json.loads( json.dumps( dictSettings ) )
+
 def viz_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None ) :
 	"""
 	visualize the data graph as a matplotlib interactive figure (that can be saved to disk if needed)
@@ -141,149 +706,731 @@ def viz_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None
 	:param dict dict_config: config object containing root node spec and filters
 	"""
 
-	search_depth = int( dict_config['search_depth'] )
-	filter_post_freq = ast.literal_eval( dict_config['filter_post_freq'] )
-	list_direction = dict_config['list_direction']
+	import networkx as nx
+	import matplotlib.pyplot as plt
+
 	layout_name = dict_config['layout_name']
-	max_nodes = int( dict_config['max_nodes'] )
-	list_pseudonymization = dict_config['list_pseudonymization']
-	aggregate_nodes = True
 
-	# change current (default) figure size to be the screen size for a large display
+	size_figure_to_screen( dict_config = dict_config )
+
+	G = build_data_graph(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config )
+
+	colour_map = dict_config['colour_map']
+
+	# make names and sizes for all nodes
+	listNodeSizes = []
+	dictNodeNames = {}
+	for (strNode,dictAttr) in G.nodes(data=True) :
+		listNodeSizes.append( dictAttr['size'] )
+		dictNodeNames[strNode] = dictAttr['label']
+
+	# layout by edge weight
+	dictEdgeLabels = nx.get_edge_attributes( G, 'weight' )
+
+	pos = layout_data_graph(
+		G,
+		list_root_nodes = list_root_nodes,
+		layout_name = layout_name )
+
+	listNodeColours = []
+	for (strNode,dictAttr) in G.nodes(data=True) :
+		listNodeColours.append( colour_map[ dictAttr['category'] ] )
+
+	listEdgeColours = []
+	listEdgeLineWidths = []
+	for ( strNode1,strNode2,dictAttr ) in G.edges(data=True) :
+		strCat = G.nodes[ strNode1 ]['category']
+		listEdgeColours.append( colour_map[ strCat ] )
+		nWidth = dictAttr['weight']
+		if nWidth > 5 :
+			nWidth = 5
+		listEdgeLineWidths.append( nWidth )
+
+	nx.draw(G,
+		pos,
+		linewidths=1,
+		node_size=listNodeSizes,
+		alpha=0.9,
+		font_size= 12,
+		labels=dictNodeNames,
+		node_color = listNodeColours,
+		edge_color = listEdgeColours,
+		width = listEdgeLineWidths,
+		)
+
+
+	nx.draw_networkx_edge_labels(
+		G,
+		pos,
+		edge_labels = dictEdgeLabels,
+		font_color='grey' )
+
+	limits = plt.axis('off')  # turn off axis
+
+	plt.show()
+
+def size_figure_to_screen( dict_config = None ) :
+	"""
+	change current (default) matplotlib figure size to be the screen size for a large display
+
+	:param dict dict_config: config object
+	"""
+
+	import matplotlib.pyplot as plt
+
 	screen_y = plt.get_current_fig_manager().window.winfo_screenheight()
 	screen_x = plt.get_current_fig_manager().window.winfo_screenwidth()
 	dict_config['logger'].info( 'screen size = ' + repr( (screen_x, screen_y) ) )
 	plt.gcf().set_size_inches( 0.8*screen_x/96, 0.8*screen_y/96 )
 	plt.gcf().set_dpi( 96 )
 
-	# create networkx graph object which will do the actually rendering work
-	G =  nx.Graph()
-	for strRootNode in list_root_nodes:
-		bfs(
-			G,
-			strRootNode,
+def explore_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None ) :
+	"""
+	explore the data graph as a matplotlib interactive figure, starting at search depth 1 and expanding a node's neighbours when it is clicked.
+	neighbours are found in the index using list_direction and aggregated on their @@@ base name (like aggregate_nodes_with_same_base()).
+	the positions of nodes already drawn are fixed, so each click only lays out and draws the new nodes and edges.
+	each click adds at most max_nodes new nodes (highest edge weight first), and nodes gaining edges are redrawn with their new size.
+	a node can be clicked again after new entities are aggregated into it, to walk the links of those entities.
+	use the zoom and pan tools to move around, clicks are ignored while they are active.
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object containing root node spec and filters
+	"""
+
+	import matplotlib.pyplot as plt
+
+	size_figure_to_screen( dict_config = dict_config )
+
+	dictExplore = create_explore_state(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config )
+
+	G = dictExplore['graph']
+	dictExplore['pos'] = layout_data_graph(
+		G,
+		list_root_nodes = list_root_nodes,
+		layout_name = dict_config['layout_name'] )
+
+	draw_explore_graph(
+		dictExplore,
+		list_nodes = list( G.nodes() ),
+		list_edges = list( G.edges() ),
+		dict_config = dict_config )
+
+	limits = plt.axis('off')  # turn off axis
+
+	figure = plt.gcf()
+	axes = plt.gca()
+
+	def on_click( event ) :
+		if event.inaxes != axes :
+			return
+		if (figure.canvas.toolbar != None) and (str( figure.canvas.toolbar.mode ) != '') :
+			return
+
+		strEntity = find_explore_node( dictExplore, axes, event.x, event.y )
+		if strEntity == None :
+			return
+
+		( listNewNodes, listNewEdges, listUpdatedNodes ) = expand_explore_node(
+			entity = strEntity,
+			explore_state = dictExplore,
+			entity_index = entity_index,
+			dict_config = dict_config )
+
+		if len(listNewEdges) == 0 :
+			return
+
+		layout_explore_nodes(
+			dictExplore,
+			entity = strEntity,
+			list_new_nodes = listNewNodes )
+
+		draw_explore_graph(
+			dictExplore,
+			list_nodes = listNewNodes,
+			list_edges = listNewEdges,
+			dict_config = dict_config )
+
+		redraw_explore_nodes(
+			dictExplore,
+			list_nodes = listUpdatedNodes )
+
+		axes.autoscale_view()
+		figure.canvas.draw_idle()
+
+	figure.canvas.mpl_connect( 'button_press_event', on_click )
+
+	plt.show()
+
+def create_explore_state( list_root_nodes = [], entity_index = {}, dict_config = None ) :
+	"""
+	make the graph for explore_data_graph() with the root nodes expanded (i.e. search depth 1). root nodes without any connections are removed (the same as build_data_graph()).
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object containing root node spec and filters
+	:return: explore state { 'graph' : networkx graph, 'pos' : node positions, 'members' : { node : [ entity ] }, 'base_node' : { base name : node }, 'walked' : set of entities whose links have been walked, 'reverse_index' : reverse index or None, 'node_artists' : { node : ( matplotlib collection, index ) } }
+	:rtype: dict
+	"""
+
+	import networkx as nx
+
+	dictExplore = {
+		'graph' : nx.Graph(),
+		'pos' : {},
+		'members' : {},
+		'base_node' : {},
+		'walked' : set([]),
+		'reverse_index' : None,
+		'node_artists' : {},
+	}
+
+	# backward graph walks use a reverse index, made once so each click is quick
+	if 'backward' in dict_config['list_direction'] :
+		dictExplore['reverse_index'] = generate_reverse_index( entity_index = entity_index )
+
+	G = dictExplore['graph']
+	for strRootNode in list_root_nodes :
+		G.add_node( strRootNode, category = 'root' )
+		dictExplore['members'][strRootNode] = [ strRootNode ]
+		strBase = strRootNode.split('@@@')[0]
+		if not strBase in dictExplore['base_node'] :
+			dictExplore['base_node'][strBase] = strRootNode
+
+	for strRootNode in list_root_nodes :
+		expand_explore_node(
+			entity = strRootNode,
+			explore_state = dictExplore,
+			entity_index = entity_index,
+			dict_config = dict_config )
+
+	# a root without any connections is not part of the graph (bfs graph walks only return edges)
+	for strRootNode in list_root_nodes :
+		if G.degree( strRootNode ) == 0 :
+			G.remove_node( strRootNode )
+			del dictExplore['members'][strRootNode]
+			strBase = strRootNode.split('@@@')[0]
+			if dictExplore['base_node'][strBase] == strRootNode :
+				del dictExplore['base_node'][strBase]
+
+	for strRootNode in list_root_nodes :
+		if strRootNode in G :
+			update_explore_node_attributes( dictExplore, strRootNode, dict_config )
+
+	dict_config['logger'].info( 'explore graph nodes = ' + str(len(G)) )
+
+	return dictExplore
+
+def expand_explore_node( entity = None, explore_state = None, entity_index = {}, dict_config = None ) :
+	"""
+	add the neighbours of a node to the explore graph. the links of each entity aggregated into the node are only walked once, so expanding a node again
+	only walks entities aggregated into it since it was last expanded.
+	neighbours with the same @@@ base name as a node already in the graph are aggregated into that node, otherwise they are aggregated into a new node.
+	new post nodes representing fewer than filter_post_freq posts are ignored, and only the top max_nodes new nodes (by edge weight) are added.
+	the attributes of the expanded node and of existing nodes that gain an edge are updated.
+
+	:param str entity: node in the explore graph to expand
+	:param dict explore_state: explore state created by create_explore_state()
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object containing root node spec and filters
+	:return: new nodes, new edges, existing nodes whose attributes changed
+	:rtype: list, list, list
+	"""
+
+	G = explore_state['graph']
+	dictMembers = explore_state['members']
+	dictBaseNode = explore_state['base_node']
+	dictReverseIndex = explore_state['reverse_index']
+	list_direction = dict_config['list_direction']
+	filter_post_freq = ast.literal_eval( dict_config['filter_post_freq'] )
+	max_nodes = int( dict_config['max_nodes'] )
+
+	listMembersToWalk = []
+	for strMember in dictMembers[entity] :
+		if not strMember in explore_state['walked'] :
+			listMembersToWalk.append( strMember )
+	if len(listMembersToWalk) == 0 :
+		return ( [], [], [] )
+	explore_state['walked'].update( listMembersToWalk )
+
+	# edge weight to each existing node and new base name (one per connected entity of each aggregated member, the same as bfs followed by aggregation)
+	dictExistingWeight = {}
+	dictNewWeight = {}
+	dictNewVariants = {}
+	for strMember in listMembersToWalk :
+		if not strMember in entity_index :
+			continue
+
+		# linked entities in the order a bfs() graph walk finds them (forward then backward), so the first variant of a new base name is the node bfs keeps
+		dictLinked = {}
+		if 'forward' in list_direction :
+			dictLinked.update( dict.fromkeys( entity_index[strMember] ) )
+		if ('backward' in list_direction) and (strMember in dictReverseIndex) :
+			dictLinked.update( dict.fromkeys( dictReverseIndex[strMember] ) )
+
+		for strEntityLinked in dictLinked :
+			strBase = strEntityLinked.split('@@@')[0]
+			if strBase in dictBaseNode :
+				strNode = dictBaseNode[strBase]
+				if strNode == entity :
+					continue
+				dictExistingWeight[strNode] = dictExistingWeight.get( strNode, 0 ) + 1
+				if not strEntityLinked in dictMembers[strNode] :
+					dictMembers[strNode].append( strEntityLinked )
+			else :
+				dictNewWeight[strBase] = dictNewWeight.get( strBase, 0 ) + 1
+				if not strBase in dictNewVariants :
+					dictNewVariants[strBase] = []
+				if not strEntityLinked in dictNewVariants[strBase] :
+					dictNewVariants[strBase].append( strEntityLinked )
+
+	# new post nodes below threshold are removed
+	listNewBase = []
+	for strBase in dictNewWeight :
+		if (filter_post_freq != None) and (strBase.startswith('posts[')) :
+			if len( dictNewVariants[strBase] ) < filter_post_freq :
+				continue
+		listNewBase.append( strBase )
+
+	listNewBase = sorted( listNewBase, key=lambda entry: dictNewWeight[entry], reverse=True )
+	if len(listNewBase) > max_nodes :
+		dict_config['logger'].info( 'max nodes exceeded # ' + str(len(listNewBase) - max_nodes) + ' nodes not expanded' )
+		listNewBase = listNewBase[ :max_nodes ]
+
+	listNewNodes = []
+	listNewEdges = []
+	listUpdatedNodes = []
+
+	for strNode in dictExistingWeight :
+		if not G.has_edge( entity, strNode ) :
+			G.add_edge( entity, strNode, weight = dictExistingWeight[strNode] )
+			listNewEdges.append( ( entity, strNode ) )
+			listUpdatedNodes.append( strNode )
+
+	for strBase in listNewBase :
+		strNode = dictNewVariants[strBase][0]
+		dictBaseNode[strBase] = strNode
+		dictMembers[strNode] = dictNewVariants[strBase]
+		G.add_edge( entity, strNode, weight = dictNewWeight[strBase] )
+		listNewNodes.append( strNode )
+		listNewEdges.append( ( entity, strNode ) )
+
+	for strNode in listNewNodes :
+		G.nodes[strNode]['category'] = classify_entity(
+			entity = strNode,
+			dict_config = dict_config )
+		update_explore_node_attributes( explore_state, strNode, dict_config )
+
+	# existing nodes with new edges have more connections
+	if len(listNewEdges) > 0 :
+		listUpdatedNodes.append( entity )
+	for strNode in listUpdatedNodes :
+		update_explore_node_attributes( explore_state, strNode, dict_config )
+
+	dict_config['logger'].info( 'expanded ' + repr(entity) + ' : ' + str(len(listNewNodes)) + ' new nodes, ' + str(len(listNewEdges)) + ' new edges' )
+
+	return ( listNewNodes, listNewEdges, listUpdatedNodes )
+
+def update_explore_node_attributes( explore_state = None, entity = None, dict_config = None ) :
+	"""
+	set the label, size and connections attributes of a node in the explore graph (category must already be set)
+
+	:param dict explore_state: explore state created by create_explore_state()
+	:param str entity: node in the explore graph
+	:param dict dict_config: config object
+	"""
+
+	G = explore_state['graph']
+
+	nConnections = 0
+	dictEdges = G[entity]
+	for strNodeConnected in dictEdges :
+		nConnections = nConnections + dictEdges[strNodeConnected]['weight']
+
+	G.nodes[entity]['label'] = resolve_node_label(
+		entity = entity,
+		category = G.nodes[entity]['category'],
+		dict_config = dict_config )
+	G.nodes[entity]['size'] = get_node_size( nConnections )
+	G.nodes[entity]['connections'] = nConnections
+
+def layout_explore_nodes( explore_state = None, entity = None, list_new_nodes = [] ) :
+	"""
+	compute positions for new nodes in the explore graph, keeping the positions of all other nodes fixed.
+	new nodes start on a circle around the expanded node and a spring layout is run on just the new nodes and their neighbours.
+
+	:param dict explore_state: explore state created by create_explore_state()
+	:param str entity: expanded node
+	:param list list_new_nodes: new nodes to position
+	"""
+
+	import networkx as nx
+
+	if len(list_new_nodes) == 0 :
+		return
+
+	G = explore_state['graph']
+	pos = explore_state['pos']
+
+	# radius from the average spacing of the nodes already drawn
+	listX = [ pos[strNode][0] for strNode in pos ]
+	listY = [ pos[strNode][1] for strNode in pos ]
+	nExtent = max( max(listX) - min(listX), max(listY) - min(listY) )
+	nRadius = nExtent / ( 2 * math.sqrt( len(pos) ) )
+	if nRadius <= 0 :
+		nRadius = 1.0
+
+	( nCentreX, nCentreY ) = pos[entity]
+	dictInitialPos = {}
+	for nIndex in range( len(list_new_nodes) ) :
+		nAngle = 2 * math.pi * nIndex / len(list_new_nodes)
+		dictInitialPos[ list_new_nodes[nIndex] ] = ( nCentreX + nRadius * math.cos(nAngle), nCentreY + nRadius * math.sin(nAngle) )
+
+	setNodes = set( list_new_nodes )
+	for strNode in list_new_nodes :
+		setNodes.update( G[strNode] )
+	listFixed = []
+	for strNode in setNodes :
+		if strNode in pos :
+			dictInitialPos[strNode] = pos[strNode]
+			listFixed.append( strNode )
+
+	dictNewPos = nx.spring_layout(
+		G.subgraph( setNodes ),
+		pos = dictInitialPos,
+		fixed = listFixed,
+		k = nRadius,
+		weight = 'weight',
+		iterations = 50 )
+
+	for strNode in list_new_nodes :
+		pos[strNode] = dictNewPos[strNode]
+
+def find_explore_node( explore_state = None, axes = None, x = None, y = None ) :
+	"""
+	find the node drawn at a display (pixel) position
+
+	:param dict explore_state: explore state created by create_explore_state()
+	:param axes: matplotlib axes the graph is drawn on
+	:param float x: display x position
+	:param float y: display y position
+	:return: nearest node within its drawn radius (or None)
+	:rtype: str
+	"""
+
+	G = explore_state['graph']
+	pos = explore_state['pos']
+	nPixelsPerPoint = axes.figure.dpi / 72.0
+
+	strResult = None
+	nBestDist = None
+	for strNode in pos :
+		( nNodeX, nNodeY ) = axes.transData.transform( pos[strNode] )
+		nDist = math.sqrt( (nNodeX - x)**2 + (nNodeY - y)**2 )
+
+		# node_size is the marker area in points^2
+		nNodeRadius = nPixelsPerPoint * math.sqrt( G.nodes[strNode]['size'] ) / 2
+		if nDist > max( nNodeRadius, 5 ) :
+			continue
+		if (nBestDist == None) or (nDist < nBestDist) :
+			nBestDist = nDist
+			strResult = strNode
+
+	return strResult
+
+def draw_explore_graph( explore_state = None, list_nodes = [], list_edges = [], dict_config = None ) :
+	"""
+	draw a set of nodes and edges from the explore graph onto the current matplotlib figure (nodes already drawn are not redrawn)
+
+	:param dict explore_state: explore state created by create_explore_state()
+	:param list list_nodes: nodes to draw
+	:param list list_edges: edges to draw
+	:param dict dict_config: config object
+	"""
+
+	import networkx as nx
+
+	G = explore_state['graph']
+	pos = explore_state['pos']
+	colour_map = dict_config['colour_map']
+
+	listNodeSizes = []
+	listNodeColours = []
+	dictNodeNames = {}
+	for strNode in list_nodes :
+		listNodeSizes.append( G.nodes[strNode]['size'] )
+		listNodeColours.append( colour_map[ G.nodes[strNode]['category'] ] )
+		dictNodeNames[strNode] = G.nodes[strNode]['label']
+
+	listEdgeColours = []
+	listEdgeLineWidths = []
+	dictEdgeLabels = {}
+	for ( strNode1,strNode2 ) in list_edges :
+		strCat = G.nodes[ strNode1 ]['category']
+		listEdgeColours.append( colour_map[ strCat ] )
+		nWidth = G[strNode1][strNode2]['weight']
+		dictEdgeLabels[ ( strNode1,strNode2 ) ] = nWidth
+		if nWidth > 5 :
+			nWidth = 5
+		listEdgeLineWidths.append( nWidth )
+
+	if len(list_edges) > 0 :
+		nx.draw_networkx_edges( G,
+			pos,
+			edgelist = list_edges,
+			alpha = 0.9,
+			edge_color = listEdgeColours,
+			width = listEdgeLineWidths )
+
+		nx.draw_networkx_edge_labels(
+			G,
+			pos,
+			edge_labels = dictEdgeLabels,
+			font_color='grey' )
+
+	if len(list_nodes) > 0 :
+		collectionNodes = nx.draw_networkx_nodes( G,
+			pos,
+			nodelist = list_nodes,
+			linewidths = 1,
+			node_size = listNodeSizes,
+			alpha = 0.9,
+			node_color = listNodeColours )
+
+		# remember where each node is drawn so redraw_explore_nodes() can change its size
+		for nIndex in range( len(list_nodes) ) :
+			explore_state['node_artists'][ list_nodes[nIndex] ] = ( collectionNodes, nIndex )
+
+		nx.draw_networkx_labels( G,
+			pos,
+			labels = dictNodeNames,
+			font_size = 12 )
+
+def redraw_explore_nodes( explore_state = None, list_nodes = [] ) :
+	"""
+	update the drawn size of nodes already drawn by draw_explore_graph() (e.g. after they gain edges)
+
+	:param dict explore_state: explore state created by create_explore_state()
+	:param list list_nodes: nodes to redraw
+	"""
+
+	G = explore_state['graph']
+
+	for strNode in list_nodes :
+		if not strNode in explore_state['node_artists'] :
+			continue
+		( collectionNodes, nIndex ) = explore_state['node_artists'][strNode]
+		arraySizes = collectionNodes.get_sizes().copy()
+		arraySizes[nIndex] = G.nodes[strNode]['size']
+		collectionNodes.set_sizes( arraySizes )
+
+def export_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None, export_file = None ) :
+	"""
+	export the data graph to a file for an external renderer (e.g. Gephi, Cytoscape, D3) instead of drawing it with matplotlib.
+	no layout is computed unless export_positions = True in the config, so batch jobs only pay for the BFS, aggregation and pruning.
+	the export format is taken from the filename extension (.graphml, .gexf or .json for node-link JSON).
+	if pseudonymization is enabled node identifiers are replaced by integers so the original entity names do not leak into the file.
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object containing root node spec and filters
+	:param str export_file: filename to write the graph to
+	"""
+
+	import networkx as nx
+
+	if not isinstance( export_file, str) :
+		raise Exception( 'export_file invalid : ' + repr(export_file) )
+
+	strFormat = os.path.splitext( export_file )[1].lower()
+	if not strFormat in [ '.graphml', '.gexf', '.json' ] :
+		raise Exception( 'unknown export format (expected .graphml, .gexf or .json) : ' + repr(export_file) )
+
+	G = build_data_graph(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config )
+
+	# optional node positions (computed with the configured layout)
+	bPositions = False
+	if 'export_positions' in dict_config :
+		bPositions = ast.literal_eval( dict_config['export_positions'] )
+
+	if bPositions == True :
+		pos = layout_data_graph(
+			G,
+			list_root_nodes = list_root_nodes,
+			layout_name = dict_config['layout_name'] )
+		for strNode in pos :
+			G.nodes[strNode]['x'] = float( pos[strNode][0] )
+			G.nodes[strNode]['y'] = float( pos[strNode][1] )
+
+	# hide entity names used as node identifiers if the graph is pseudonymized
+	if len( dict_config['list_pseudonymization'] ) > 0 :
+		G = nx.convert_node_labels_to_integers( G )
+
+	if strFormat == '.graphml' :
+		nx.write_graphml( G, export_file )
+	elif strFormat == '.gexf' :
+		nx.write_gexf( G, export_file )
+	else :
+		writeHandle = codecs.open( filename=export_file, mode='w', encoding='utf-8' )
+		json.dump( nx.node_link_data( G ), writeHandle, separators=(',',':') )
+		writeHandle.close()
+
+	dict_config['logger'].info( 'exported graph to ' + repr(export_file) + ' (' + str(G.number_of_nodes()) + ' nodes, ' + str(G.number_of_edges()) + ' edges)' )
+
+def build_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None ) :
+	"""
+	build the final networkx graph for a set of root nodes (BFS, aggregation, categorization and pruning to max_nodes).
+	the graph size is checked before the graph walk if preflight_max_nodes is set (see preflight_graph_size()).
+	each node has a category, label (pretty printed and pseudonymized), size and connections attribute. no layout or drawing is done.
+
+	:param list list_root_nodes: list of root node entities
+	:param dict entity_index: entity index created by load_data_graph()
+	:param dict dict_config: config object containing root node spec and filters
+	:return: graph ready for rendering or export
+	:rtype: networkx.Graph
+	"""
+
+	search_depth = preflight_graph_size(
+		list_root_nodes = list_root_nodes,
+		entity_index = entity_index,
+		dict_config = dict_config )
+	filter_post_freq = ast.literal_eval( dict_config['filter_post_freq'] )
+	list_direction = dict_config['list_direction']
+	max_nodes = int( dict_config['max_nodes'] )
+	aggregate_nodes = True
+
+	strTraversal = 'bfs'
+	if 'traversal' in dict_config :
+		strTraversal = dict_config['traversal']
+
+	max_edges = None
+	if 'max_edges' in dict_config :
+		max_edges = ast.literal_eval( dict_config['max_edges'] )
+
+	# aggregation, categorization and pruning work on a native graph, which is only converted to a networkx graph for rendering at the end
+	dictGraph = create_native_graph()
+	if strTraversal == 'bfs' :
+		for strRootNode in list_root_nodes:
+			listEBunch = bfs_edges(
+				strRootNode,
+				entity_index,
+				search_depth = search_depth,
+				list_direction = list_direction )
+			add_native_edges( dictGraph, listEBunch )
+	elif strTraversal == 'best_first' :
+		listEBunch = best_first_edges(
+			list_root_nodes,
 			entity_index,
 			search_depth = search_depth,
-			list_direction = list_direction )
+			list_direction = list_direction,
+			max_nodes = max_nodes,
+			max_edges = max_edges )
+		add_native_edges( dictGraph, listEBunch )
+	elif strTraversal == 'sparse' :
+		dictEngine = build_adjacency_engine(
+			entity_index = entity_index,
+			list_direction = list_direction,
+			sparse_matrix = False )
+		dictReachable = batch_reachability(
+			list_root_nodes = list_root_nodes,
+			engine = dictEngine,
+			search_depth = search_depth )
+		for strRootNode in list_root_nodes :
+			add_native_edges( dictGraph, dictReachable[strRootNode][1] )
+	else :
+		raise Exception( 'unknown traversal : ' + repr(strTraversal) )
 	
 	#dict_config['logger'].info( 'graph nodes = ' + str(len(G)) )
 
 	if aggregate_nodes == True :
-		aggregate_nodes_with_same_base(
-			G,
-			entity_index = entity_index,
+		aggregate_native_nodes(
+			dictGraph,
 			root_node_list = list_root_nodes,
 			filter_post_freq = filter_post_freq )
 
-	dict_config['logger'].info( 'graph nodes after aggregation = ' + str(len(G)) )
-
-	colour_map = dict_config['colour_map']
-	nx.set_node_attributes( G, name='category', values=colour_map )
+	dict_config['logger'].info( 'graph nodes after aggregation = ' + str(len(dictGraph['node_id'])) )
 
-	for strEntity in G.nodes() :
-		if strEntity in list_root_nodes :
-			G.nodes[strEntity]['category'] = 'root'
+	dictNodeAttributes = {}
+	setRootNodes = set( list_root_nodes )
+	for strEntity in native_graph_nodes( dictGraph ) :
+		if strEntity in setRootNodes :
+			dictNodeAttributes[strEntity] = { 'category' : 'root' }
 		else :
-			bFound = False
-			for strCategory in dict_config['entity_prefix_map'] :
-				for strPrefix in dict_config['entity_prefix_map'][strCategory] :
-					if strEntity.startswith( strPrefix ) :
-						G.nodes[strEntity]['category'] = strCategory
-						bFound = True
-						break
-				if bFound == True :
-					break
-			if bFound == False :
-				G.nodes[strEntity]['category'] = 'unknown'
-
-	# order nodes by connection density
-	listOrderedNodes = []
-	for strEntity in G.nodes() :
-		# sum up the weights of each edge 
-		nConnections = 0
-		dictEdges = G[strEntity]
-		for strNodeConnected in dictEdges :
-			nConnections = nConnections + dictEdges[strNodeConnected]['weight']
-		listOrderedNodes.append( ( strEntity,nConnections ) )
+			dictNodeAttributes[strEntity] = { 'category' : classify_entity(
+				entity = strEntity,
+				dict_config = dict_config ) }
+
+	# order nodes by connection density (sum of the weights of each edge)
+	listOrderedNodes = native_weighted_degree( dictGraph )
 	listOrderedNodes = sorted( listOrderedNodes, key=lambda entry: entry[1], reverse=True )
 
 	# remove all but top N nodes to avoid overloading the graph (which will be very slow to render)
-	nRemovedCount = 0
-	if G.number_of_nodes() > max_nodes :
+	if len(listOrderedNodes) > max_nodes :
 		# remove nodes outside topN (and not a root node)
+		listRemove = []
+		for ( strEntity, nConnections ) in listOrderedNodes[ max_nodes: ] :
+			if not strEntity in setRootNodes :
+				listRemove.append( strEntity )
+		prune_native_nodes( dictGraph, listRemove )
 
-		nIndex1 = max_nodes
-		while nIndex1 < len(listOrderedNodes) :
-			( strEntityOrderedList, nConnectionsOrderedList ) = listOrderedNodes[ nIndex1 ]
-			if not strEntityOrderedList in list_root_nodes :
-				G.remove_node( strEntityOrderedList )
-				del listOrderedNodes[ nIndex1 ]
-				nRemovedCount += 1
-			else :
-				nIndex1 += 1
-
-		dict_config['logger'].info( 'max nodes exceeded # ' + str(nRemovedCount) + ' nodes removed' )
+		dict_config['logger'].info( 'max nodes exceeded # ' + str(len(listRemove)) + ' nodes removed' )
 
 	# make names and sizes for all nodes
-	listNodeSizes = []
-	dictNodeNames = {}
-	listPseudonymization = dict_config['list_pseudonymization']
+	dictConnections = dict( listOrderedNodes )
 
-	for strEntity in G.nodes() :
-		for ( strEntityOrderedList, nConnectionsOrderedList ) in listOrderedNodes :
-			if strEntityOrderedList == strEntity :
-				nConnections = nConnectionsOrderedList
-				break
+	for strEntity in native_graph_nodes( dictGraph ) :
+		nConnections = dictConnections[strEntity]
+		nSize = get_node_size( nConnections )
 
-		if nConnections < 10 :
-			nSize = 200
-		elif nConnections < 20 :
-			nSize = 400
-		elif nConnections < 50 :
-			nSize = 800
-		else :
-			nSize = 1600
-		listNodeSizes.append( nSize )
-
-		# pretty print entities
-		if '@@@' in strEntity :
-			strName = strEntity.split('@@@')[0]
-		elif ':' in strEntity :
-			strName = ':'.join(strEntity.split(':')[1:])
-		else :
-			strName = strEntity
+		strName = resolve_node_label(
+			entity = strEntity,
+			category = dictNodeAttributes[strEntity]['category'],
+			dict_config = dict_config )
 
-		# pseudonymization (use hash of name prefixed by type)
-		if (len(listPseudonymization) > 0) and (len(strName) > 0) :
+		dictNodeAttributes[strEntity]['label'] = strName
+		dictNodeAttributes[strEntity]['size'] = nSize
+		dictNodeAttributes[strEntity]['connections'] = nConnections
 
-			strCat = G.nodes[strEntity]['category']
-			if strCat in listPseudonymization :
-				strHashedName = hashlib.shake_256( strName.encode("utf-8") ).hexdigest( 2 )
+	return native_graph_to_networkx( dictGraph, dictNodeAttributes )
 
-				if strCat.startswith('entity_') :
-					strName = strCat[ len('entity_') : ] + '_' + strHashedName
-				elif strCat == 'root' :
-					strName = 'target_' + strHashedName
-				elif strName.startswith('thread[') :
-					strName = 'thread_' + strHashedName
-				else :
-					strName = strCat + '_' + strHashedName
+def get_node_size( connections = 0 ) :
+	"""
+	get the drawn size of a node from its connections (sum of its edge weights)
 
-		# truncate long names (too log to fit like page URL's - 30 character limit)
-		nTrunc = int( dict_config['max_node_text_length'] )
-		if nTrunc != 0 :
-			strName = strName[:nTrunc]
+	:param int connections: sum of edge weights
+	:return: node size
+	:rtype: int
+	"""
 
-		# add name to dict
-		dictNodeNames[strEntity] = strName
+	if connections < 10 :
+		return 200
+	elif connections < 20 :
+		return 400
+	elif connections < 50 :
+		return 800
+	return 1600
 
-		# show NER types as prefix (normally would not do this, useful for debug)
-		if 'preserve_node_prefix' in dict_config :
-			if ast.literal_eval( dict_config['preserve_node_prefix'] ) == True :
-				dictNodeNames[strEntity] = strEntity
+def layout_data_graph( G, list_root_nodes = [], layout_name = None ) :
+	"""
+	compute node positions for a graph using a networkx layout
 
-	# layout by edge weight
-	dictEdgeLabels = nx.get_edge_attributes( G, 'weight' )
+	:param G: which is the graph
+	:param list list_root_nodes: list of root node entities (inner shell for shell layout)
+	:param str layout_name: layout name (spring, random, spectral or shell)
+	:return: node positions
+	:rtype: dict
+	"""
+
+	import networkx as nx
 
 	if layout_name == 'spring' :
 		pos = nx.spring_layout( G, weight='weight', scale = 10 )
@@ -303,65 +1450,448 @@ def viz_data_graph( list_root_nodes = [], entity_index = {}, dict_config = None
 	else :
 		raise Exception( 'unknown layout : ' + repr(layout_name) )
 
-	listNodeColours = []
-	for (strNode,dictAttr) in G.nodes(data=True) :
-		listNodeColours.append( colour_map[ dictAttr['category'] ] )
+	return pos
 
-	listEdgeColours = []
-	listEdgeLineWidths = []
-	for ( strNode1,strNode2,dictAttr ) in G.edges(data=True) :
-		strCat = G.nodes[ strNode1 ]['category']
-		listEdgeColours.append( colour_map[ strCat ] )
-		nWidth = dictAttr['weight']
-		if nWidth > 5 :
-			nWidth = 5
-		listEdgeLineWidths.append( nWidth )
 
-	nx.draw(G,
-		pos,
-		linewidths=1,
-		node_size=listNodeSizes,
-		alpha=0.9,
-		font_size= 12,
-		labels=dictNodeNames,
-		node_color = listNodeColours,
-		edge_color = listEdgeColours,
-		width = listEdgeLineWidths,
-		)
 
 
-	nx.draw_networkx_edge_labels(
-		G,
-		pos,
-		edge_labels = dictEdgeLabels,
-		font_color='grey' )
+def classify_entity( entity = None, dict_config = None ) :
+	"""
+	get the category of an entity using the entity_prefix_map in the config (first matching category wins, otherwise unknown).
+	the prefix map is compiled once into dict_config['category_classifier'], and results are cached on the entity type token (text up to the first ':' or '[',
+	e.g. 'NER-PERSON:' or 'posts[') so most lookups are a single dict access. entities without a type token are not cached.
 
-	limits = plt.axis('off')  # turn off axis
+	:param str entity: entity to classify
+	:param dict dict_config: config object
+	:return: category name
+	:rtype: str
+	"""
 
-	plt.show()
+	if not 'category_classifier' in dict_config :
+		dict_config['category_classifier'] = create_category_classifier( dict_config = dict_config )
+	dictClassifier = dict_config['category_classifier']
+
+	strKey = None
+	if dictClassifier['cache'] != None :
+		nPos = len(entity)
+		for strDelimiter in ( ':', '[' ) :
+			nFound = entity.find( strDelimiter )
+			if (nFound != -1) and (nFound < nPos) :
+				nPos = nFound
+		if nPos < len(entity) :
+			strKey = entity[ :nPos + 1 ]
+			if strKey in dictClassifier['cache'] :
+				return dictClassifier['cache'][strKey]
+
+	strText = entity
+	if strKey != None :
+		strText = strKey
+
+	strResult = 'unknown'
+	for ( strCategory, tuplePrefix ) in dictClassifier['categories'] :
+		if strText.startswith( tuplePrefix ) :
+			strResult = strCategory
+			break
+
+	if strKey != None :
+		dictClassifier['cache'][strKey] = strResult
+
+	return strResult
+
+def create_category_classifier( dict_config = None ) :
+	"""
+	compile the entity_prefix_map in the config into a category classifier for classify_entity().
+	the type token cache is only enabled if no prefix extends past the first ':' or '[' of an entity (e.g. 'NER-PERSON:' or 'posts[' but not 'NER-PERSON:Di'),
+	since only then does the type token alone decide the category.
+
+	:param dict dict_config: config object
+	:return: category classifier
+	:rtype: dict
+	"""
+
+	listCategories = []
+	bCacheable = True
+	for strCategory in dict_config['entity_prefix_map'] :
+		tuplePrefix = tuple( dict_config['entity_prefix_map'][strCategory] )
+		listCategories.append( ( strCategory, tuplePrefix ) )
+
+		for strPrefix in tuplePrefix :
+			for nPos in range( len(strPrefix) - 1 ) :
+				if strPrefix[nPos] in ( ':', '[' ) :
+					bCacheable = False
+
+	dictCache = None
+	if bCacheable == True :
+		dictCache = {}
+
+	return {
+		'categories' : listCategories,
+		'cache' : dictCache,
+		}
+
+def resolve_node_label( entity = None, category = None, dict_config = None ) :
+	"""
+	get the display label for a node (pretty printed, pseudonymized and truncated). labels are memoised in dict_config['label_cache'] so
+	an entity seen for many targets in a batch is only formatted and hashed once, and always gets the same label.
+
+	:param str entity: node entity
+	:param str category: node category (e.g. root, post, entity_person)
+	:param dict dict_config: config object
+	:return: node label
+	:rtype: str
+	"""
+
+	if not 'label_cache' in dict_config :
+		dict_config['label_cache'] = create_label_cache( dict_config = dict_config )
+
+	dictLabels = dict_config['label_cache']['labels']
+	if not category in dictLabels :
+		dictLabels[category] = {}
+	if entity in dictLabels[category] :
+		return dictLabels[category][entity]
+
+	dictSettings = dict_config['label_cache']['settings']
+	listPseudonymization = dictSettings['list_pseudonymization']
+
+	# pretty print entities
+	if '@@@' in entity :
+		strName = entity.split('@@@')[0]
+	elif ':' in entity :
+		strName = ':'.join(entity.split(':')[1:])
+	else :
+		strName = entity
+
+	# pseudonymization (use hash of name prefixed by type)
+	if (len(listPseudonymization) > 0) and (len(strName) > 0) :
+
+		if category in listPseudonymization :
+			strHashedName = hashlib.shake_256( strName.encode("utf-8") ).hexdigest( 2 )
+
+			if category.startswith('entity_') :
+				strName = category[ len('entity_') : ] + '_' + strHashedName
+			elif category == 'root' :
+				strName = 'target_' + strHashedName
+			elif strName.startswith('thread[') :
+				strName = 'thread_' + strHashedName
+			else :
+				strName = category + '_' + strHashedName
+
+	# truncate long names (too log to fit like page URL's - 30 character limit)
+	nTrunc = dictSettings['max_node_text_length']
+	if nTrunc != 0 :
+		strName = strName[:nTrunc]
+
+	# show NER types as prefix (normally would not do this, useful for debug)
+	if dictSettings['preserve_node_prefix'] == True :
+		strName = entity
+
+	dictLabels[category][entity] = strName
+	return strName
+
+def create_label_cache( dict_config = None ) :
+	"""
+	create an empty label cache for resolve_node_label(). the label settings from the config are parsed once and stored with the cache.
+
+	:param dict dict_config: config object
+	:return: label cache
+	:rtype: dict
+	"""
+
+	bPreservePrefix = False
+	if 'preserve_node_prefix' in dict_config :
+		bPreservePrefix = ast.literal_eval( dict_config['preserve_node_prefix'] )
+
+	return {
+		'settings' : {
+			'list_pseudonymization' : list( dict_config['list_pseudonymization'] ),
+			'max_node_text_length' : int( dict_config['max_node_text_length'] ),
+			'preserve_node_prefix' : bPreservePrefix,
+			},
+		'labels' : {},
+		}
+
+def read_label_cache( filename = None, dict_config = None ) :
+	"""
+	load a label cache saved by write_label_cache() into dict_config['label_cache'].
+	if the file does not exist, or was made with different label settings, an empty label cache is used instead.
+
+	:param str filename: label cache filename (JSON formatted)
+	:param dict dict_config: config object
+	"""
+
+	dictLabelCache = create_label_cache( dict_config = dict_config )
+
+	if os.path.exists( filename ) :
+		readHandle = codecs.open( filename=filename, mode='r', encoding='utf-8' )
+		dictLabelCacheFile = json.load( readHandle )
+		readHandle.close()
+
+		if dictLabelCacheFile['settings'] == dictLabelCache['settings'] :
+			dictLabelCache = dictLabelCacheFile
+		else :
+			dict_config['logger'].info( 'label cache settings differ from config, ignoring ' + repr(filename) )
+
+	dict_config['label_cache'] = dictLabelCache
+
+def write_label_cache( filename = None, dict_config = None ) :
+	"""
+	save dict_config['label_cache'] to disk so labels are stable across runs
+
+	:param str filename: label cache filename (JSON formatted)
+	:param dict dict_config: config object
+	"""
+
+	if not 'label_cache' in dict_config :
+		dict_config['label_cache'] = create_label_cache( dict_config = dict_config )
+
+	writeHandle = codecs.open( filename=filename, mode='w', encoding='utf-8' )
+	json.dump( dict_config['label_cache'], writeHandle, ensure_ascii=False )
+	writeHandle.close()
+
+def generate_data_graph_file_list( data_graph_file = None, dict_config = {} ) :
+	"""
+	expand a data graph file, directory (all .json and .jsonl files in it) or glob pattern into a sorted list of data graph files.
+	files from sites listed in exclude_sites in the config are skipped without being read. a file belongs to a site if its filename
+	is <website>.json, <website>.jsonl or starts with <website>_ (e.g. siteA_2020_07.json).
+
+	:param str data_graph_file: filename, directory or glob pattern (or a list of these)
+	:param dict dict_config: config object
+	:return: list of data graph filenames
+	:rtype: list
+	"""
+
+	listPaths = data_graph_file
+	if not isinstance( data_graph_file, list ) :
+		listPaths = [ data_graph_file ]
+
+	listExcludeSites = []
+	if 'exclude_sites' in dict_config :
+		listExcludeSites = dict_config['exclude_sites']
+
+	listFiles = []
+	for strPath in listPaths :
+		if os.path.isdir( strPath ) :
+			listMatches = glob.glob( os.path.join( strPath, '*.json' ) ) + glob.glob( os.path.join( strPath, '*.jsonl' ) )
+		elif os.path.isfile( strPath ) :
+			listMatches = [ strPath ]
+		else :
+			listMatches = glob.glob( strPath )
+
+		for strFile in sorted( listMatches ) :
+			if not os.path.isfile( strFile ) :
+				continue
 
+			strName = os.path.basename( strFile )
+			bExcluded = False
+			for strSite in listExcludeSites :
+				if strName.startswith( strSite + '_' ) or (strName in [ strSite + '.json', strSite + '.jsonl' ]) :
+					bExcluded = True
+					break
 
+			if bExcluded == True :
+				if 'logger' in dict_config :
+					dict_config['logger'].info( 'skipping excluded site file : ' + repr(strFile) )
+			elif not strFile in listFiles :
+				listFiles.append( strFile )
 
+	return listFiles
 
 def index_intel_data( file_json = None, dict_config = {} ):
 	"""
-	load a JSON file with intelligence data and create a set of entity indexes
+	load JSON files with intelligence data and create a set of entity indexes.
+	files ending .jsonl are read as JSON Lines (one JSON object of posts per line), otherwise each file is a single JSON object of posts.
+	if ingest_processes > 1 in the config the files (and byte ranges of JSON Lines files) are indexed in parallel by a process pool and
+	the partial indexes merged in input order, giving the same index as a serial run.
 
-	:param unicode file_json: filename of JSON intelligence report to load
+	:param unicode file_json: filename (or list of filenames) of JSON intelligence report to load
 	:param dict dict_config: config object
 
 	:return: entity index
 	:rtype: dict
 	"""
 
-	readHandle = codecs.open( filename=file_json, mode='r', encoding='utf-8', errors='replace' )
-	strTotalText = readHandle.read()
-	readHandle.close()
-	dictJSON = json.loads( strTotalText )
+	listFiles = file_json
+	if not isinstance( file_json, list ) :
+		listFiles = [ file_json ]
+
+	nProcesses = 1
+	if 'ingest_processes' in dict_config :
+		nProcesses = int( dict_config['ingest_processes'] )
+
+	listExcludeSites = []
+	if 'exclude_sites' in dict_config :
+		listExcludeSites = dict_config['exclude_sites']
+
+	listShards = generate_shard_list(
+		list_files = listFiles,
+		shard_count = nProcesses )
+
+	dictEntityIndex = {}
+
+	if (nProcesses > 1) and (len(listShards) > 1) :
+		# index shards in parallel then merge partial indexes in input order
+		poolWorkers = multiprocessing.Pool( processes = min( nProcesses, len(listShards) ) )
+		try :
+			listArgs = []
+			for tupleShard in listShards :
+				listArgs.append( ( tupleShard, listExcludeSites ) )
+			listPartialIndex = poolWorkers.map( index_intel_shard, listArgs, chunksize = 1 )
+		finally :
+			poolWorkers.close()
+			poolWorkers.join()
+
+		for ( dictPartialIndex, listPostEntities ) in listPartialIndex :
+			merge_entity_index(
+				entity_index = dictEntityIndex,
+				partial_index = dictPartialIndex,
+				list_post_entities = listPostEntities )
+	else :
+		for tupleShard in listShards :
+			index_intel_posts(
+				list_posts = read_intel_shard( tupleShard, listExcludeSites ),
+				entity_index = dictEntityIndex )
+
+	# all done
+	return dictEntityIndex
+
+def generate_shard_list( list_files = None, shard_count = 1 ) :
+	"""
+	split a list of data graph files into shards for indexing. JSON files are a single shard, JSON Lines files are split into byte ranges.
+
+	:param list list_files: list of data graph filenames
+	:param int shard_count: number of byte range shards to split each JSON Lines file into
+	:return: list of shards (filename, start byte, end byte) in input order. start and end byte are None for JSON files.
+	:rtype: list
+	"""
+
+	# avoid tiny shards where process overhead outweighs any gain
+	nMinShardBytes = 1024 * 1024
+
+	listShards = []
+	for strFile in list_files :
+		if strFile.lower().endswith('.jsonl') :
+			nSize = os.path.getsize( strFile )
+			nShards = max( 1, min( shard_count, nSize // nMinShardBytes ) )
+			nShardSize = nSize // nShards + 1
+			for nIndex in range(nShards) :
+				listShards.append( ( strFile, nIndex * nShardSize, min( nSize, (nIndex + 1) * nShardSize ) ) )
+		else :
+			listShards.append( ( strFile, None, None ) )
+
+	return listShards
+
+def read_intel_shard( tuple_shard, list_exclude_sites = [] ) :
+	"""
+	read the posts in a data graph shard. for JSON Lines byte ranges a line belongs to the shard containing its first byte.
+
+	:param tuple tuple_shard: shard (filename, start byte, end byte) created by generate_shard_list()
+	:param list list_exclude_sites: websites whose posts (<website>_thread_<thread_id>_post_<post_id>) are skipped
+	:return: list of (post ID, post) in file order
+	:rtype: list
+	"""
+
+	( strFile, nStart, nEnd ) = tuple_shard
+
+	if nStart == None :
+		readHandle = codecs.open( filename=strFile, mode='r', encoding='utf-8', errors='replace' )
+		strTotalText = readHandle.read()
+		readHandle.close()
+		dictJSON = json.loads( strTotalText )
+		return filter_post_sites( list( dictJSON.items() ), list_exclude_sites )
+
+	listPosts = []
+	readHandle = open( strFile, 'rb' )
+	try :
+		# skip partial line (it belongs to the previous shard)
+		if nStart > 0 :
+			readHandle.seek( nStart - 1 )
+			readHandle.readline()
+
+		while readHandle.tell() < nEnd :
+			bytesLine = readHandle.readline()
+			if len(bytesLine) == 0 :
+				break
+
+			strLine = bytesLine.decode( 'utf-8', errors='replace' ).strip()
+			if len(strLine) > 0 :
+				listPosts.extend( json.loads( strLine ).items() )
+	finally :
+		readHandle.close()
+
+	return filter_post_sites( listPosts, list_exclude_sites )
+
+def filter_post_sites( list_posts = None, list_exclude_sites = [] ) :
+	"""
+	remove posts from excluded websites. the website is the part of the post ID before _thread_.
+
+	:param list list_posts: list of (post ID, post)
+	:param list list_exclude_sites: websites to exclude
+	:return: list of (post ID, post) not from an excluded website
+	:rtype: list
+	"""
+
+	if len(list_exclude_sites) == 0 :
+		return list_posts
+
+	setExcludeSites = set( list_exclude_sites )
+	listResult = []
+	for ( strPostID, dictPost ) in list_posts :
+		if ('_thread_' in strPostID) and (strPostID[ :strPostID.index('_thread_') ] in setExcludeSites) :
+			continue
+		listResult.append( ( strPostID, dictPost ) )
+
+	return listResult
+
+def index_intel_shard( tuple_args ) :
+	"""
+	process pool worker for index_intel_data(). index a single shard.
+
+	:param tuple tuple_args: shard (filename, start byte, end byte) created by generate_shard_list(), list of websites to exclude
+	:return: partial entity index, list of post entities in the partial index
+	:rtype: dict, list
+	"""
+
+	( tupleShard, listExcludeSites ) = tuple_args
 
 	dictEntityIndex = {}
-	for strPostID in dictJSON :
-		dictPost = dictJSON[strPostID]
+	setPostEntities = set([])
+	index_intel_posts(
+		list_posts = read_intel_shard( tupleShard, listExcludeSites ),
+		entity_index = dictEntityIndex,
+		set_post_entities = setPostEntities )
+
+	return dictEntityIndex, list( setPostEntities )
+
+def merge_entity_index( entity_index = None, partial_index = None, list_post_entities = None ) :
+	"""
+	merge a partial entity index from a later shard into an entity index, exactly as if its posts had been indexed after the existing ones.
+	post entities are replaced (a repeated post ID is re-indexed from scratch), other connections take the later shard value
+	(author and thread post connections are always 1, and thread entity freq is set by the last post to mention the entity).
+
+	:param dict entity_index: entity index to update
+	:param dict partial_index: partial entity index created by index_intel_shard()
+	:param list list_post_entities: post entities in the partial index
+	"""
+
+	setPostEntities = set( list_post_entities )
+	for strEntity in partial_index :
+		if (strEntity in setPostEntities) or (not strEntity in entity_index) :
+			entity_index[strEntity] = partial_index[strEntity]
+		else :
+			entity_index[strEntity].update( partial_index[strEntity] )
+
+def index_intel_posts( list_posts = None, entity_index = None, set_post_entities = None ) :
+	"""
+	add posts to an entity index
+
+	:param list list_posts: list of (post ID, post) to index
+	:param dict entity_index: entity index to update
+	:param set set_post_entities: optional set to add the post entities to
+	"""
+
+	dictEntityIndex = entity_index
+
+	for ( strPostID, dictPost ) in list_posts :
 
 		if not 'author' in dictPost :
 			raise Exception( 'post with no author : ' + repr(strPostID) )
@@ -375,6 +1905,9 @@ def index_intel_data( file_json = None, dict_config = {} ):
 		strAuthorEntity = 'NER-PERSON:' + strAuthor
 		strPageURLEntity = 'PAGE-URL:' + strPostURL
 
+		if set_post_entities != None :
+			set_post_entities.add( strPostEntity )
+
 		strThread = 'thread[unknown]'
 		if 'thread_' in strPostID :
 			strThread = strPostID[ strPostID.index('thread_') + len('thread_') : ]
@@ -430,9 +1963,6 @@ def index_intel_data( file_json = None, dict_config = {} ):
 									dictEntityIndex[ strPostEntity ][ strEntityLabel ] += 1
 									dictEntityIndex[ strThread ][ strEntityLabel ] += 1
 
-	# all done
-	return dictEntityIndex
-
 def generate_root_node_list( entity_index = None, dict_config = {} ):
 	"""
 	generate a root node list from the entity index
@@ -451,7 +1981,8 @@ def generate_root_node_list( entity_index = None, dict_config = {} ):
 
 def entity_lookup_using_filter( entity_index, filter_spec, dict_config = {} ) :
 	"""
-	filter entity index according to a filter spec
+	filter entity index according to a filter spec. the match and avoid entity patterns are each compiled once by create_entity_matcher(),
+	with avoid patterns keeping their original meaning unless they use the '*<text>*' or '(?i)' forms.
 
 	:param dict entity_index: index created by load_data_graph()
 	:param dict filter_spec: filter spec to apply
@@ -490,63 +2021,22 @@ def entity_lookup_using_filter( entity_index, filter_spec, dict_config = {} ) :
 	# if we have an entity pattern then make a set of matches that match this, otherwise default to all entities
 	setMatch = set([])
 	if filter_spec['match']['entity'] != None :
-		for strEntityPattern in filter_spec['match']['entity'] :
-			for strEntity in entity_index :
-				strEntityToMatch = strEntity
-				strPatternToMatch = strEntityPattern
-
-				# if needed strip entity prefix from entity match
-				if strEntityPattern.startswith('?:') :
-					if ':' in strEntityToMatch :
-						strEntityToMatch = strEntityToMatch[ strEntityToMatch.index(':') + 2 : ]
-						strPatternToMatch = strEntityPattern[3:]
-
-				# now match
-				if strPatternToMatch.endswith('*') :
-					if strEntityToMatch.startswith( strPatternToMatch[:-1] ) :
-
-						nConnections = 0
-						for strEntityLink in entity_index[strEntity] :
-							nConnections = nConnections + entity_index[strEntity][strEntityLink]
-
-						bBad = False
-						if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-							bBad = True
-						if (nMinFreq != None) and (nConnections < nMinFreq) :
-							bBad = True
-
-						if bBad == False :
-							setMatch.add( strEntity )
-				elif strPatternToMatch.startswith('*') :
-					if strEntityToMatch.endswith( strPatternToMatch[1:] ) :
-
-						nConnections = 0
-						for strEntityLink in entity_index[strEntity] :
-							nConnections = nConnections + entity_index[strEntity][strEntityLink]
-
-						bBad = False
-						if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-							bBad = True
-						if (nMinFreq != None) and (nConnections < nMinFreq) :
-							bBad = True
-
-						if bBad == False :
-							setMatch.add( strEntity )
-				else :
-					if strPatternToMatch == strEntityToMatch :
+		dictMatcher = create_entity_matcher( filter_spec['match']['entity'] )
+		for strEntity in entity_index :
+			if match_entity( strEntity, dictMatcher ) == True :
 
-						nConnections = 0
-						for strEntityLink in entity_index[strEntity] :
-							nConnections = nConnections + entity_index[strEntity][strEntityLink]
+				nConnections = 0
+				for strEntityLink in entity_index[strEntity] :
+					nConnections = nConnections + entity_index[strEntity][strEntityLink]
 
-						bBad = False
-						if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-							bBad = True
-						if (nMinFreq != None) and (nConnections < nMinFreq) :
-							bBad = True
+				bBad = False
+				if (nMaxFreq != None) and (nConnections > nMaxFreq) :
+					bBad = True
+				if (nMinFreq != None) and (nConnections < nMinFreq) :
+					bBad = True
 
-						if bBad == False :
-							setMatch.add( strEntity )
+				if bBad == False :
+					setMatch.add( strEntity )
 	else :
 		for strEntity in entity_index :
 			setMatch.add( strEntity )
@@ -582,64 +2072,287 @@ def entity_lookup_using_filter( entity_index, filter_spec, dict_config = {} ) :
 	# get banned matches
 	setBanned = set([])
 	if filter_spec['avoid']['entity'] != None :
-		for strEntityPattern in filter_spec['avoid']['entity'] :
-			if strEntityPattern.endswith('*') :
-				for strEntity in setMatch :
-					if strEntity.startswith( strEntityPattern[:-1] ) :
-
-						nConnections = 0
-						for strEntityLink in entity_index[strEntity] :
-							nConnections = nConnections + entity_index[strEntity][strEntityLink]
-
-						bBad = False
-						if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-							bBad = True
-						if (nMinFreq != None) and (nConnections < nMinFreq) :
-							bBad = True
-
-						if bBad == False :
-							setBanned.add( strEntity )
-			else :
-				if strEntityPattern in setMatch:
-					nConnections = 0
-					for strEntityLink in entity_index[strEntityPattern] :
-						nConnections = nConnections + entity_index[strEntityPattern][strEntityLink]
+		dictMatcher = create_entity_matcher( filter_spec['avoid']['entity'], legacy_syntax = True )
+		for strEntity in setMatch :
+			if match_entity( strEntity, dictMatcher ) == True :
+
+				nConnections = 0
+				for strEntityLink in entity_index[strEntity] :
+					nConnections = nConnections + entity_index[strEntity][strEntityLink]
 
-					bBad = False
-					if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-						bBad = True
-					if (nMinFreq != None) and (nConnections < nMinFreq) :
-						bBad = True
+				bBad = False
+				if (nMaxFreq != None) and (nConnections > nMaxFreq) :
+					bBad = True
+				if (nMinFreq != None) and (nConnections < nMinFreq) :
+					bBad = True
 
-					if bBad == False :
-						setBanned.add( strEntityPattern )
+				if bBad == False :
+					setBanned.add( strEntity )
 
 	elif (nMaxFreq != None) or (nMinFreq != None) :
 		# no entity name pattern to match but we do have a freq range (so match any entity that has a freq in this range)
 		for strEntity in setMatch :
 
-			nConnections = 0
-			for strEntityLink in entity_index[strEntity] :
-				nConnections = nConnections + entity_index[strEntity][strEntityLink]
+			nConnections = 0
+			for strEntityLink in entity_index[strEntity] :
+				nConnections = nConnections + entity_index[strEntity][strEntityLink]
+
+			bBad = False
+			if (nMaxFreq != None) and (nConnections > nMaxFreq) :
+				bBad = True
+			if (nMinFreq != None) and (nConnections < nMinFreq) :
+				bBad = True
+
+			if bBad == False :
+				setBanned.add( strEntity )
+
+	#
+	# remove banned matches
+	#
+
+	for strEntity in setBanned :
+		setMatch.remove( strEntity )
+	
+	# all done
+	return list( setMatch )
+
+def entity_lookup_using_entity_names( list_entity = None, filter_spec = None ) :
+	"""
+	find entities that might match a filter spec using only the 'match' entity name patterns (freq ranges and 'avoid' are ignored).
+	this is used when entity connections are not known yet (e.g. cluster IDs before clustering), and can return more entities than entity_lookup_using_filter().
+
+	:param list list_entity: list of entities to check
+	:param dict filter_spec: filter spec to apply
+	:return: list of entities that might match
+	:rtype: list
+	"""
+
+	if filter_spec['match']['entity'] == None :
+		if filter_spec['match']['entity_freq_range'] == None :
+			return []
+		return list( list_entity )
+
+	dictNameIndex = {}
+	for strEntity in list_entity :
+		dictNameIndex[strEntity] = {}
+
+	return entity_lookup_using_filter(
+		entity_index = dictNameIndex,
+		filter_spec = {
+			'match' : { 'entity' : filter_spec['match']['entity'], 'entity_freq_range' : None },
+			'avoid' : { 'entity' : None, 'entity_freq_range' : None },
+			} )
+
+def create_entity_matcher( list_patterns = None, legacy_syntax = False ) :
+	"""
+	compile a list of entity patterns into a matcher for match_entity(), so each entity name is checked against every pattern at once.
+	patterns are '<text>' (exact), '<text>*' (starts with), '*<text>' (ends with) or '*<text>*' (contains). a '?:' prefix matches the entity name
+	after its type prefix (e.g. '?:*lappa' matches 'NER-PLANT:red saussurea lappa'), and a '(?i)' prefix makes the pattern case insensitive (e.g. '(?i)?:*SAUSSUREA*').
+	plain '?:<text>' and '?:<text>*' patterns keep their original (legacy) matching, which drops one more character from both the pattern and the entity name.
+	for each group of patterns (same '?:' and '(?i)' settings) exact patterns are looked up in a set, starts with / ends with patterns use a single
+	str.startswith() / str.endswith() call, and only contains patterns share an Aho-Corasick automaton.
+	with legacy_syntax (used for avoid lists) only '*<text>*' and '(?i)' patterns get this handling, and all other patterns keep the original avoid
+	behaviour of '<text>*' (whole entity starts with) or '<text>' (whole entity is exactly), with no '?:' or ends with handling.
+
+	:param list list_patterns: list of entity patterns
+	:param bool legacy_syntax: if True use the original avoid list meaning for patterns not in the '*<text>*' or '(?i)' forms
+	:return: entity matcher { 'groups' : [ { 'text' : str, 'nocase' : bool, 'exact' : set, 'always' : bool, 'prefix' : tuple, 'suffix' : tuple, 'automaton' : dict } ] }
+	:rtype: dict
+	"""
+
+	dictGroups = {}
+	for strPattern in list_patterns :
+		bNoCase = False
+		if strPattern.startswith('(?i)') :
+			bNoCase = True
+			strPattern = strPattern[4:]
+
+		bAnyType = strPattern.startswith('?:')
+		strBody = strPattern
+		if bAnyType == True :
+			strBody = strPattern[2:]
+		bContains = (len(strBody) >= 2) and strBody.startswith('*') and strBody.endswith('*')
+
+		# '(?i)', '*<text>*' and (except in avoid lists) '*<text>' patterns use the full syntax. other patterns keep their original meaning
+		bLegacy = True
+		if (bNoCase == True) or (bContains == True) or ( (legacy_syntax == False) and strBody.startswith('*') ) :
+			bLegacy = False
+
+		if bLegacy == False :
+			if bAnyType == True :
+				# '?:' matches the entity name after the type prefix (entities without a type prefix have no name to match)
+				listVariants = [ ( 'name', strBody ) ]
+			else :
+				listVariants = [ ( 'entity', strPattern ) ]
+		elif legacy_syntax == True :
+			# original avoid list meaning (whole entity, no '?:' handling)
+			listVariants = [ ( 'entity', strPattern ) ]
+		elif bAnyType == True :
+			# original match list meaning, a preserved legacy quirk: one more character is dropped from both the pattern and the entity name,
+			# and an entity without a type prefix is compared with the whole pattern
+			listVariants = [ ( 'legacy_name', strPattern[3:] ), ( 'untyped', strPattern ) ]
+		else :
+			listVariants = [ ( 'entity', strPattern ) ]
+
+		for ( strText, strLiteral ) in listVariants :
+			if bNoCase == True :
+				strLiteral = strLiteral.lower()
+
+			if not ( strText, bNoCase ) in dictGroups :
+				dictGroups[ ( strText, bNoCase ) ] = {
+					'text' : strText,
+					'nocase' : bNoCase,
+					'exact' : set([]),
+					'always' : False,
+					'prefix' : [],
+					'suffix' : [],
+					'contains' : [],
+					'automaton' : None,
+				}
+			dictGroup = dictGroups[ ( strText, bNoCase ) ]
+
+			if (bLegacy == False) and (len(strLiteral) >= 2) and strLiteral.startswith('*') and strLiteral.endswith('*') :
+				( strLiteral, strKind ) = ( strLiteral[1:-1], 'contains' )
+			elif strLiteral.endswith('*') :
+				( strLiteral, strKind ) = ( strLiteral[:-1], 'prefix' )
+			elif ( (bLegacy == False) or (legacy_syntax == False) ) and strLiteral.startswith('*') :
+				( strLiteral, strKind ) = ( strLiteral[1:], 'suffix' )
+			else :
+				dictGroup['exact'].add( strLiteral )
+				continue
+
+			if len(strLiteral) == 0 :
+				dictGroup['always'] = True
+			else :
+				dictGroup[strKind].append( strLiteral )
+
+	for dictGroup in dictGroups.values() :
+		dictGroup['prefix'] = tuple( dictGroup['prefix'] )
+		dictGroup['suffix'] = tuple( dictGroup['suffix'] )
+		if len( dictGroup['contains'] ) > 0 :
+			dictGroup['automaton'] = create_pattern_automaton( dictGroup['contains'] )
+		del dictGroup['contains']
+
+	return {
+		'groups' : list( dictGroups.values() ),
+		}
+
+def match_entity( entity = None, matcher = None ) :
+	"""
+	check if an entity matches any pattern of an entity matcher
+
+	:param str entity: entity to check
+	:param dict matcher: entity matcher created by create_entity_matcher()
+	:return: True if a pattern matches
+	:rtype: bool
+	"""
+
+	for dictGroup in matcher['groups'] :
+		if dictGroup['text'] == 'name' :
+			if not ':' in entity :
+				continue
+			strText = entity[ entity.index(':') + 1 : ]
+		elif dictGroup['text'] == 'legacy_name' :
+			if not ':' in entity :
+				continue
+			strText = entity[ entity.index(':') + 2 : ]
+		elif dictGroup['text'] == 'untyped' :
+			if ':' in entity :
+				continue
+			strText = entity
+		else :
+			strText = entity
+
+		if dictGroup['always'] == True :
+			return True
+
+		if dictGroup['nocase'] == True :
+			strText = strText.lower()
+
+		if strText in dictGroup['exact'] :
+			return True
+
+		# an empty tuple never matches
+		if strText.startswith( dictGroup['prefix'] ) == True :
+			return True
+
+		if strText.endswith( dictGroup['suffix'] ) == True :
+			return True
+
+		if dictGroup['automaton'] != None :
+			if search_pattern_automaton( strText, dictGroup['automaton'] ) == True :
+				return True
+
+	return False
+
+def create_pattern_automaton( list_literals = None ) :
+	"""
+	internal function to build an Aho-Corasick automaton for a list of literals, so search_pattern_automaton() can find any of them in a single pass over a text
+
+	:param list list_literals: list of literals
+	:return: automaton { 'goto' : list of dict, 'fail' : list of int, 'output' : list of bool }
+	:rtype: dict
+	"""
 
-			bBad = False
-			if (nMaxFreq != None) and (nConnections > nMaxFreq) :
-				bBad = True
-			if (nMinFreq != None) and (nConnections < nMinFreq) :
-				bBad = True
+	listGoto = [ {} ]
+	listOutput = [ False ]
+
+	# trie of all literals
+	for strLiteral in list_literals :
+		nState = 0
+		for strChar in strLiteral :
+			if not strChar in listGoto[nState] :
+				listGoto[nState][strChar] = len(listGoto)
+				listGoto.append( {} )
+				listOutput.append( False )
+			nState = listGoto[nState][strChar]
+		listOutput[nState] = True
+
+	# failure links (longest proper suffix that is also in the trie), set breadth first so shorter states are done first
+	listFail = [ 0 ] * len(listGoto)
+	listQueue = list( listGoto[0].values() )
+	nIndex = 0
+	while nIndex < len(listQueue) :
+		nState = listQueue[nIndex]
+		nIndex += 1
+		for ( strChar, nNext ) in listGoto[nState].items() :
+			listQueue.append( nNext )
+			nFail = listFail[nState]
+			while (nFail != 0) and (not strChar in listGoto[nFail]) :
+				nFail = listFail[nFail]
+			if (strChar in listGoto[nFail]) and (listGoto[nFail][strChar] != nNext) :
+				listFail[nNext] = listGoto[nFail][strChar]
+			listOutput[nNext] = listOutput[nNext] or listOutput[ listFail[nNext] ]
+
+	return {
+		'goto' : listGoto,
+		'fail' : listFail,
+		'output' : listOutput,
+		}
+
+def search_pattern_automaton( text = None, automaton = None ) :
+	"""
+	internal function to check if any literal of an automaton made by create_pattern_automaton() appears anywhere in a text
 
-			if bBad == False :
-				setBanned.add( strEntity )
+	:param str text: text to search
+	:param dict automaton: automaton created by create_pattern_automaton()
+	:return: True if a literal is found
+	:rtype: bool
+	"""
 
-	#
-	# remove banned matches
-	#
+	listGoto = automaton['goto']
+	listFail = automaton['fail']
+	listOutput = automaton['output']
 
-	for strEntity in setBanned :
-		setMatch.remove( strEntity )
-	
-	# all done
-	return list( setMatch )
+	nState = 0
+	for strChar in text :
+		while (nState != 0) and (not strChar in listGoto[nState]) :
+			nState = listFail[nState]
+		nState = listGoto[nState].get( strChar, 0 )
+		if listOutput[nState] == True :
+			return True
+
+	return False
 
 def cluster_index( entity_index = None, list_root_nodes = None, dict_config = {} ):
 	"""
@@ -757,6 +2470,28 @@ def bfs( G, start, entity_index = None, search_depth = None, list_direction = No
 	:param search_depth: depth of graph to build
 	:param list_direction: direction of graph walk
 	"""
+
+	listEBunch = bfs_edges(
+		start,
+		entity_index,
+		search_depth = search_depth,
+		list_direction = list_direction )
+
+	# add edges (this will add nodes if they are missing)
+	# note: using ebunch is orders of magnitude more efficient way to build a graph in networkx than using many add_edge() calls
+	G.add_weighted_edges_from( listEBunch, weight='weight' )
+
+def bfs_edges( start, entity_index = None, search_depth = None, list_direction = None ):
+	"""
+	breadth first search of entity index returning the edges found (no networkx graph is needed). graphs start from a root nodes
+
+	:param start: root node
+	:param dict entity_index: index created by load_data_graph()
+	:param search_depth: depth of graph to build
+	:param list_direction: direction of graph walk
+	:return: list of edges (entity1, entity2, weight)
+	:rtype: list
+	"""
 	listEBunch = []
 	listVisited = []
 	queueNodes = [(start, 0)]
@@ -785,10 +2520,642 @@ def bfs( G, start, entity_index = None, search_depth = None, list_direction = No
 						queueNodes.append( (strEntity2, nLevel+1) )
 						listVisited.append( strEntity2 )
 
-	# add edges (this will add nodes if they are missing)
-	# note: using ebunch is orders of magnitude more efficient way to build a graph in networkx than using many add_edge() calls
-	G.add_weighted_edges_from( listEBunch, weight='weight' )
+	return listEBunch
+
+def best_first_edges( list_root_nodes, entity_index = None, search_depth = None, list_direction = None, max_nodes = None, max_edges = None, reverse_index = None ):
+	"""
+	best first search of entity index returning the edges found. nodes are included in order of the connection freq (in the index) of the edge they were found by,
+	and the search stops once max_nodes nodes (counted after aggregation of nodes with the same base name) or max_edges edges are found.
+	root nodes are always included and the search_depth limit is kept. if no limit is reached the edges are the same as bfs() for all root nodes.
+	neighbours are taken lazily: each expanded node has one heap entry that steps through its neighbours sorted by freq, so the heap size depends on the number of expanded nodes
+	rather than on how many connections they have.
+
+	:param list list_root_nodes: root nodes
+	:param dict entity_index: index created by load_data_graph()
+	:param search_depth: depth of graph to build
+	:param list_direction: direction of graph walk
+	:param int max_nodes: node budget (can be None for no limit)
+	:param int max_edges: edge budget (can be None for no limit)
+	:param dict reverse_index: reverse index from generate_reverse_index() (made if None and list_direction includes backward)
+	:return: list of edges (entity1, entity2, weight)
+	:rtype: list
+	"""
+
+	# backward walks use a reverse index so each expansion does not scan the whole index
+	if ('backward' in list_direction) and (reverse_index == None) :
+		reverse_index = generate_reverse_index( entity_index = entity_index )
+
+	listEBunch = []
+	setEdges = set([])
+	dictLevel = {}
+	dictExpandedLevel = {}
+	setBaseNames = set([])
+
+	# neighbours of each expanded node ( list in generate_new_list() order, positions of those not yet included sorted by freq ), keyed on expansion sequence
+	dictNeighbours = {}
+
+	# heap of (-freq, sequence, neighbour index, position, entity, level). ties are taken in the order they were found.
+	# position -1 is a node to expand at level (a root, or a node reached by a shorter path), otherwise the entry is the expanded node's next neighbour (position in its sorted neighbours)
+	heapNodes = []
+	nSequence = 0
+
+	def expand_node( strNode, nLevel, nPriority ) :
+		nonlocal nSequence
+
+		if nLevel >= search_depth :
+			return
+		if (strNode in dictExpandedLevel) and (dictExpandedLevel[strNode] <= nLevel) :
+			return
+		dictExpandedLevel[strNode] = nLevel
+
+		if not strNode in entity_index :
+			return
+
+		# same neighbours (and order) as generate_new_list()
+		listLinked = []
+		if 'forward' in list_direction :
+			listLinked.extend( entity_index[strNode] )
+		if ('backward' in list_direction) and (strNode in reverse_index) :
+			listLinked.extend( reverse_index[strNode] )
+
+		nSeqExpand = nSequence
+		nSequence += 1
+
+		# neighbours already included get their edge now (and are expanded again if this is a shorter path to them)
+		listOrder = []
+		for nIndex in range( len(listLinked) ) :
+			strEntityLinked = listLinked[nIndex]
+			if strEntityLinked in dictLevel :
+				add_unique_edge( listEBunch, setEdges, strNode, strEntityLinked )
+				if nLevel + 1 < dictLevel[strEntityLinked] :
+					heapq.heappush( heapNodes, ( nPriority, nSeqExpand, nIndex, -1, strEntityLinked, nLevel + 1 ) )
+			else :
+				listOrder.append( nIndex )
+
+		# the other neighbours are taken one at a time, highest freq first
+		if len(listOrder) > 0 :
+			listOrder.sort( key=lambda entry: -get_connection_freq( entity_index, strNode, listLinked[entry] ) )
+			dictNeighbours[nSeqExpand] = ( listLinked, listOrder )
+			heapq.heappush( heapNodes, ( -get_connection_freq( entity_index, strNode, listLinked[ listOrder[0] ] ), nSeqExpand, listOrder[0], 0, strNode, nLevel ) )
+
+	for strRootNode in list_root_nodes :
+		if not strRootNode in dictLevel :
+			dictLevel[strRootNode] = 0
+			setBaseNames.add( strRootNode.split('@@@')[0] )
+			heapq.heappush( heapNodes, ( 0, nSequence, 0, -1, strRootNode, 0 ) )
+			nSequence += 1
+
+	bNodeBudgetReached = False
+	while len(heapNodes) > 0 :
+
+		( nPriority, nSeq, nIndex, nPos, strNode, nLevel ) = heapq.heappop( heapNodes )
+
+		if nPos == -1 :
+			if nLevel < dictLevel[strNode] :
+				dictLevel[strNode] = nLevel
+			expand_node( strNode, dictLevel[strNode], nPriority )
+		else :
+			# step this node's entry on to its next neighbour
+			( listLinked, listOrder ) = dictNeighbours[nSeq]
+			strEntityLinked = listLinked[nIndex]
+			if nPos + 1 < len(listOrder) :
+				heapq.heappush( heapNodes, ( -get_connection_freq( entity_index, strNode, listLinked[ listOrder[nPos + 1] ] ), nSeq, listOrder[nPos + 1], nPos + 1, strNode, nLevel ) )
+			else :
+				del dictNeighbours[nSeq]
+
+			if strEntityLinked in dictLevel :
+				add_unique_edge( listEBunch, setEdges, strNode, strEntityLinked )
+
+				# shorter path to a node already included (expand it again so its connections get the shorter path too)
+				if nLevel + 1 < dictLevel[strEntityLinked] :
+					dictLevel[strEntityLinked] = nLevel + 1
+					expand_node( strEntityLinked, nLevel + 1, nPriority )
+			else :
+				# new node (check the node budget on its aggregated base name)
+				strBase = strEntityLinked.split('@@@')[0]
+				if (max_nodes != None) and (not strBase in setBaseNames) and (len(setBaseNames) >= max_nodes) :
+					heapq.heappush( heapNodes, ( nPriority, nSeq, nIndex, nPos, strNode, nLevel ) )
+					dictNeighbours[nSeq] = ( listLinked, listOrder )
+					bNodeBudgetReached = True
+					break
+				setBaseNames.add( strBase )
+				dictLevel[strEntityLinked] = nLevel + 1
+				add_unique_edge( listEBunch, setEdges, strNode, strEntityLinked )
+				expand_node( strEntityLinked, nLevel + 1, nPriority )
+
+		if (max_edges != None) and (len(listEBunch) >= max_edges) :
+			break
+
+	# once the node budget is reached, the expanded nodes still connect to any included node they have not got to yet
+	if bNodeBudgetReached == True :
+		for ( nPriority, nSeq, nIndex, nPos, strNode, nLevel ) in sorted( heapNodes ) :
+			if nPos == -1 :
+				continue
+			( listLinked, listOrder ) = dictNeighbours[nSeq]
+			for nOrder in range( nPos, len(listOrder) ) :
+				if listLinked[ listOrder[nOrder] ] in dictLevel :
+					add_unique_edge( listEBunch, setEdges, strNode, listLinked[ listOrder[nOrder] ] )
+
+	if (max_edges != None) and (len(listEBunch) > max_edges) :
+		listEBunch = listEBunch[:max_edges]
+
+	return listEBunch
+
+def add_unique_edge( ebunch, set_edges, entity1, entity2 ):
+	"""
+	internal function called by best_first_edges to add an undirected edge once
+
+	:param ebunch: list of edges (entity1, entity2, weight)
+	:param set_edges: set of edges already in ebunch
+	:param entity1: entity
+	:param entity2: entity
+	"""
+
+	tupleEdge = ( entity1, entity2 )
+	if entity2 < entity1 :
+		tupleEdge = ( entity2, entity1 )
+	if not tupleEdge in set_edges :
+		set_edges.add( tupleEdge )
+		ebunch.append( ( entity1, entity2, 1 ) )
+
+def shortest_paths( entity_from = None, entity_to = None, entity_index = None, list_direction = None, max_paths = 5, max_hops = None, reverse_index = None ):
+	"""
+	find the shortest connections between two entities (e.g. how is suspect A connected to suspect B) using a bidirectional breadth first search of the entity index.
+	each step of a path follows the same forward and backward connections as a bfs() graph walk from entity_from. all paths have the same (shortest) number of hops,
+	and up to max_paths are returned, strongest first (highest total connection freq).
+
+	:param str entity_from: start entity
+	:param str entity_to: end entity
+	:param dict entity_index: index created by load_data_graph()
+	:param list list_direction: direction of graph walk
+	:param int max_paths: max number of paths to return
+	:param int max_hops: optional max number of hops in a path (can be None for no limit)
+	:param dict reverse_index: optional index created by generate_reverse_index() (made if None)
+	:return: list of paths. each path is a tuple of (list of entities, list of connection freqs between them)
+	:rtype: list
+	"""
+
+	if (not entity_from in entity_index) or (not entity_to in entity_index) :
+		raise Exception( 'entity not in index : ' + repr( [entity_from, entity_to] ) )
+
+	if reverse_index == None :
+		reverse_index = generate_reverse_index( entity_index = entity_index )
+
+	if entity_from == entity_to :
+		return [ ( [ entity_from ], [] ) ]
+
+	# distance and parents (all previous nodes on a shortest path) for each side of the search
+	dictDistFrom = { entity_from : 0 }
+	dictParentFrom = { entity_from : [] }
+	listFrontierFrom = [ entity_from ]
+	dictDistTo = { entity_to : 0 }
+	dictParentTo = { entity_to : [] }
+	listFrontierTo = [ entity_to ]
+	nDepthFrom = 0
+	nDepthTo = 0
+
+	nShortest = None
+	while (len(listFrontierFrom) > 0) and (len(listFrontierTo) > 0) :
+
+		if (max_hops != None) and (nDepthFrom + nDepthTo >= max_hops) :
+			break
+
+		# expand the smallest frontier by a full layer
+		if len(listFrontierFrom) <= len(listFrontierTo) :
+			listFrontierFrom = expand_path_layer( listFrontierFrom, dictDistFrom, dictParentFrom, entity_index, reverse_index, list_direction, False )
+			nDepthFrom += 1
+			listNew = listFrontierFrom
+		else :
+			listFrontierTo = expand_path_layer( listFrontierTo, dictDistTo, dictParentTo, entity_index, reverse_index, list_direction, True )
+			nDepthTo += 1
+			listNew = listFrontierTo
+
+		for strEntity in listNew :
+			if (strEntity in dictDistFrom) and (strEntity in dictDistTo) :
+				nLength = dictDistFrom[strEntity] + dictDistTo[strEntity]
+				if (nShortest == None) or (nLength < nShortest) :
+					nShortest = nLength
+
+		if nShortest != None :
+			break
+
+	if nShortest == None :
+		return []
+
+	# every shortest path has exactly one entity at this position which both sides have reached
+	nSplit = max( 0, nShortest - nDepthTo )
+
+	# limit path enumeration as hubs can have a huge number of equally short paths
+	nMaxCandidates = 1000 * max_paths
+
+	listPaths = []
+	for strEntity in dictDistFrom :
+		if (dictDistFrom[strEntity] != nSplit) or (not strEntity in dictDistTo) or (dictDistTo[strEntity] != nShortest - nSplit) :
+			continue
+
+		for listHalfFrom in enumerate_parent_paths( strEntity, dictParentFrom, nMaxCandidates ) :
+			for listHalfTo in enumerate_parent_paths( strEntity, dictParentTo, nMaxCandidates ) :
+				listPath = list( reversed( listHalfFrom ) ) + listHalfTo[1:]
+				listFreq = []
+				for nIndex in range( len(listPath) - 1 ) :
+					listFreq.append( get_connection_freq( entity_index, listPath[nIndex], listPath[nIndex+1] ) )
+				listPaths.append( ( listPath, listFreq ) )
+
+				if len(listPaths) >= nMaxCandidates :
+					break
+			if len(listPaths) >= nMaxCandidates :
+				break
+		if len(listPaths) >= nMaxCandidates :
+			break
+
+	listPaths = sorted( listPaths, key=lambda entry: sum( entry[1] ), reverse=True )
+	return listPaths[:max_paths]
+
+def expand_path_layer( list_frontier, dict_dist, dict_parent, entity_index, reverse_index, list_direction, reverse_walk ):
+	"""
+	internal function called by shortest_paths to expand one layer of a breadth first search
+
+	:param list_frontier: entities at the current depth
+	:param dict_dist: distance of each reached entity (updated)
+	:param dict_parent: previous entities on shortest paths to each reached entity (updated)
+	:param dict entity_index: index created by load_data_graph()
+	:param dict reverse_index: index created by generate_reverse_index()
+	:param list_direction: direction of graph walk
+	:param reverse_walk: if True find entities that connect to the frontier (search from the end entity), otherwise entities the frontier connects to
+	:return: entities at the next depth
+	:rtype: list
+	"""
+
+	listFrontierNext = []
+	for strEntity in list_frontier :
+		nDist = dict_dist[strEntity] + 1
+
+		listLinked = []
+		if reverse_walk == False :
+			if strEntity in entity_index :
+				if 'forward' in list_direction :
+					listLinked.extend( entity_index[strEntity].keys() )
+				if 'backward' in list_direction :
+					listLinked.extend( reverse_index.get( strEntity, [] ) )
+		else :
+			# entities whose bfs() graph walk would step to this entity
+			if 'forward' in list_direction :
+				listLinked.extend( reverse_index.get( strEntity, [] ) )
+			if ('backward' in list_direction) and (strEntity in entity_index) :
+				for strEntityLinked in entity_index[strEntity] :
+					if strEntityLinked in entity_index :
+						listLinked.append( strEntityLinked )
+
+		for strEntityLinked in listLinked :
+			if not strEntityLinked in dict_dist :
+				dict_dist[strEntityLinked] = nDist
+				dict_parent[strEntityLinked] = [ strEntity ]
+				listFrontierNext.append( strEntityLinked )
+			elif (dict_dist[strEntityLinked] == nDist) and (not strEntity in dict_parent[strEntityLinked]) :
+				dict_parent[strEntityLinked].append( strEntity )
+
+	return listFrontierNext
+
+def enumerate_parent_paths( entity, dict_parent, max_paths ):
+	"""
+	internal function called by shortest_paths to list the paths from an entity back to the start of a search (using parent links)
+
+	:param entity: entity to start from
+	:param dict_parent: previous entities on shortest paths to each reached entity
+	:param max_paths: max number of paths to return
+	:return: list of paths (each a list of entities starting with entity)
+	:rtype: list
+	"""
+
+	listPaths = []
+	listStack = [ [ entity ] ]
+	while (len(listStack) > 0) and (len(listPaths) < max_paths) :
+		listPath = listStack.pop()
+		listParents = dict_parent[ listPath[-1] ]
+		if len(listParents) == 0 :
+			listPaths.append( listPath )
+		else :
+			for strParent in reversed( listParents ) :
+				listStack.append( listPath + [ strParent ] )
+
+	return listPaths
+
+def generate_reverse_index( entity_index = None ):
+	"""
+	make a reverse index of entity connections (entity -> entities that connect to it), so backward graph walks do not need to scan the whole index
+
+	:param dict entity_index: index created by load_data_graph()
+	:return: reverse index
+	:rtype: dict
+	"""
+
+	dictReverseIndex = {}
+	for strEntity in entity_index :
+		for strEntityLinked in entity_index[strEntity] :
+			if not strEntityLinked in dictReverseIndex :
+				dictReverseIndex[strEntityLinked] = []
+			dictReverseIndex[strEntityLinked].append( strEntity )
+
+	return dictReverseIndex
+
+def get_connection_freq( entity_index, entity1, entity2 ):
+	"""
+	get the connection freq between two entities in the index (in either direction)
+
+	:param dict entity_index: index created by load_data_graph()
+	:param entity1: entity
+	:param entity2: entity
+	:return: connection freq
+	:rtype: int
+	"""
+
+	nFreq = 0
+	if (entity1 in entity_index) and (entity2 in entity_index[entity1]) :
+		nFreq = nFreq + entity_index[entity1][entity2]
+	if (entity2 in entity_index) and (entity1 in entity_index[entity2]) :
+		nFreq = nFreq + entity_index[entity2][entity1]
+	return nFreq
+
+def build_adjacency_engine( entity_index = None, list_direction = None, sparse_matrix = True ):
+	"""
+	build an adjacency engine of the entity index, with the neighbours of each entity (as entity positions) in the order a bfs() graph walk using list_direction
+	(forward, backward or both) finds them (see generate_new_list()). this is used by batch_reachability().
+	if sparse_matrix is True a sparse adjacency matrix (SciPy CSR) is also made for build_reach_sketch(), where entry (u,v) is 1 if a bfs() graph walk steps from u to v (needs numpy and scipy).
+
+	:param dict entity_index: index created by load_data_graph()
+	:param list list_direction: direction of graph walk
+	:param bool sparse_matrix: if True make the sparse adjacency matrix and its transpose
+	:return: adjacency engine { 'matrix' : entities x entities CSR matrix or None, 'matrix_t' : transpose CSR matrix or None, 'entities' : list, 'entity_pos' : dict, 'neighbours' : list of list of entity positions }
+	:rtype: dict
+	"""
+
+	dictEntityPos = {}
+	listEntities = []
+	for strEntity in entity_index :
+		dictEntityPos[strEntity] = len(listEntities)
+		listEntities.append( strEntity )
+	for strEntity in entity_index :
+		for strEntityLinked in entity_index[strEntity] :
+			if not strEntityLinked in dictEntityPos :
+				dictEntityPos[strEntityLinked] = len(listEntities)
+				listEntities.append( strEntityLinked )
+
+	listForward = [ [] for nPos in range( len(listEntities) ) ]
+	listBackward = [ [] for nPos in range( len(listEntities) ) ]
+	for strEntity in entity_index :
+		nPos = dictEntityPos[strEntity]
+		for strEntityLinked in entity_index[strEntity] :
+			if 'forward' in list_direction :
+				listForward[nPos].append( dictEntityPos[strEntityLinked] )
+
+			# backward walks only step from entities in the index
+			if ('backward' in list_direction) and (strEntityLinked in entity_index) :
+				listBackward[ dictEntityPos[strEntityLinked] ].append( nPos )
+
+	# forward neighbours (index order of the linked entities) then backward neighbours (index order), the same as generate_new_list()
+	for nPos in range( len(listEntities) ) :
+		listForward[nPos].extend( listBackward[nPos] )
+
+	matrixAdjacency = None
+	matrixAdjacencyT = None
+	if sparse_matrix == True :
+		import numpy
+		import scipy.sparse
+
+		listRows = []
+		listCols = []
+		for nPos in range( len(listEntities) ) :
+			for nPosLinked in listForward[nPos] :
+				listRows.append( nPos )
+				listCols.append( nPosLinked )
+
+		matrixAdjacency = scipy.sparse.coo_matrix(
+			( numpy.ones( len(listRows), dtype=numpy.float64 ), ( numpy.array( listRows, dtype=numpy.int64 ), numpy.array( listCols, dtype=numpy.int64 ) ) ),
+			shape = ( len(listEntities), len(listEntities) ) ).tocsr()
+		matrixAdjacency.data[:] = 1.0
+		matrixAdjacencyT = matrixAdjacency.transpose().tocsr()
+
+	return {
+		'matrix' : matrixAdjacency,
+		'matrix_t' : matrixAdjacencyT,
+		'entities' : listEntities,
+		'entity_pos' : dictEntityPos,
+		'neighbours' : listForward,
+		}
+
+def batch_reachability( list_root_nodes = None, engine = None, search_depth = None ):
+	"""
+	depth limited graph walk for many root nodes, using the neighbour lists of an adjacency engine that is built once for all the root nodes
+	(so each step is a list lookup by entity position rather than a search of the entity index).
+	each root is walked level by level and its edges are listed in bfs() discovery order, since node aggregation depends on the order nodes are added.
+	for each root the nodes and edges (and their order, apart from repeated edges) are the same as a bfs() graph walk from that root.
+
+	:param list list_root_nodes: root nodes
+	:param dict engine: adjacency engine created by build_adjacency_engine()
+	:param search_depth: depth of graph to build
+	:return: dict of root node -> ( set of nodes, list of edges (entity1, entity2, weight) )
+	:rtype: dict
+	"""
+
+	listEntities = engine['entities']
+	listNeighbours = engine['neighbours']
+
+	dictResult = {}
+	for strRootNode in list_root_nodes :
+		dictResult[strRootNode] = ( set([]), [] )
+		if not strRootNode in engine['entity_pos'] :
+			continue
+
+		# nodes at each level below search_depth are expanded, listing an edge to each of their neighbours
+		listEBunch = []
+		nRootPos = engine['entity_pos'][strRootNode]
+		listFrontier = [ nRootPos ]
+		setSeen = set([ nRootPos ])
+		for nLevel in range( search_depth ) :
+			listNext = []
+			for nSource in listFrontier :
+				for nTarget in listNeighbours[nSource] :
+					listEBunch.append( ( listEntities[nSource], listEntities[nTarget], 1 ) )
+					if not nTarget in setSeen :
+						setSeen.add( nTarget )
+						listNext.append( nTarget )
+			if len(listNext) == 0 :
+				break
+			listFrontier = listNext
+
+		# a root without any connections is not part of its own graph (same as bfs)
+		setNodes = set([])
+		if len(listEBunch) > 0 :
+			for nPos in setSeen :
+				setNodes.add( listEntities[nPos] )
+
+		dictResult[strRootNode] = ( setNodes, listEBunch )
+
+	return dictResult
+
+def build_reach_sketch( entity_index = None, list_direction = None, search_depth = 2, precision = 6 ):
+	"""
+	build HyperLogLog sketches of the nodes and edges a bfs() graph walk would reach from each entity, for every depth up to search_depth, so graph sizes can be estimated
+	with estimate_graph_size() without a graph walk. depth k sketches are made from the depth k-1 sketches of each entity's neighbours (one sparse merge per depth).
+	sketches are kept only for entities in the index (other entities have no connections to walk). needs numpy and scipy.
+
+	:param dict entity_index: index created by load_data_graph()
+	:param list list_direction: direction of graph walk
+	:param int search_depth: max depth to sketch
+	:param int precision: HLL precision (2^precision registers per sketch, 6 gives about 13% standard error)
+	:return: reach sketch { 'direction' : list, 'depth' : int, 'precision' : int, 'entity_pos' : dict, 'nodes' : [ numpy array (entities x registers) for depth 1 .. search_depth ], 'edges' : [ numpy array ] }
+	:rtype: dict
+	"""
+
+	import numpy
+
+	dictEngine = build_adjacency_engine(
+		entity_index = entity_index,
+		list_direction = list_direction )
+	matrixAdjacency = dictEngine['matrix']
+	nEntities = len( dictEngine['entities'] )
+	nKeys = len( entity_index )
+	nRegisters = 1 << precision
+
+	# 64 bit hash of every entity, and the HLL register for each entity on its own
+	arrayHash = numpy.zeros( nEntities, dtype=numpy.uint64 )
+	for nPos in range( nEntities ) :
+		arrayHash[nPos] = int.from_bytes( hashlib.blake2b( dictEngine['entities'][nPos].encode('utf-8'), digest_size=8 ).digest(), 'big' )
+	( arrayRegister, arrayRank ) = hash_to_sketch_register( arrayHash, precision )
+	arrayOwn = numpy.zeros( ( nEntities, nRegisters ), dtype=numpy.uint8 )
+	arrayOwn[ numpy.arange( nEntities ), arrayRegister ] = arrayRank
+
+	# HLL registers for the edges of each entity (an undirected edge has the same hash from both ends, like the networkx graph)
+	arrayRows = numpy.repeat( numpy.arange( nEntities, dtype=numpy.int64 ), numpy.diff( matrixAdjacency.indptr ) )
+	arrayCols = matrixAdjacency.indices.astype( numpy.int64 )
+	arrayLow = numpy.minimum( arrayHash[arrayRows], arrayHash[arrayCols] )
+	arrayHigh = numpy.maximum( arrayHash[arrayRows], arrayHash[arrayCols] )
+	( arrayRegister, arrayRank ) = hash_to_sketch_register( mix_sketch_hash( arrayLow * numpy.uint64(0x9E3779B97F4A7C15) + arrayHigh ), precision )
+	arrayEdges1 = numpy.zeros( ( nEntities, nRegisters ), dtype=numpy.uint8 )
+	numpy.maximum.at( arrayEdges1, ( arrayRows, arrayRegister ), arrayRank )
+
+	# depth k reach = own node (or own edges) merged with the depth k-1 reach of all neighbours
+	listNodes = []
+	listEdges = []
+	arrayNodes = arrayOwn
+	arrayEdges = numpy.zeros( ( nEntities, nRegisters ), dtype=numpy.uint8 )
+	for nDepth in range( 1, max( search_depth, 1 ) + 1 ) :
+		arrayNodes = numpy.maximum( arrayOwn, merge_neighbour_sketches( matrixAdjacency, arrayNodes ) )
+		arrayEdges = numpy.maximum( arrayEdges1, merge_neighbour_sketches( matrixAdjacency, arrayEdges ) )
+		listNodes.append( arrayNodes[ :nKeys ].copy() )
+		listEdges.append( arrayEdges[ :nKeys ].copy() )
+
+	dictEntityPos = {}
+	for strEntity in entity_index :
+		dictEntityPos[strEntity] = len(dictEntityPos)
+
+	return {
+		'direction' : sorted( list_direction ),
+		'depth' : max( search_depth, 1 ),
+		'precision' : precision,
+		'entity_pos' : dictEntityPos,
+		'nodes' : listNodes,
+		'edges' : listEdges,
+		}
+
+def merge_neighbour_sketches( matrix_adjacency, sketch ):
+	"""
+	internal function called by build_reach_sketch() to merge (register max) the sketches of each entity's neighbours
+
+	:param matrix_adjacency: adjacency CSR matrix from build_adjacency_engine()
+	:param sketch: numpy array (entities x registers)
+	:return: numpy array (entities x registers) with the merged sketch of each entity's neighbours (zero if it has none)
+	:rtype: numpy.ndarray
+	"""
+
+	import numpy
+
+	arrayIndptr = matrix_adjacency.indptr
+	arrayResult = numpy.zeros( sketch.shape, dtype=sketch.dtype )
+
+	# process rows in chunks so the gathered neighbour sketches stay small
+	nMaxChunk = 1 << 20
+	nRowStart = 0
+	nRows = sketch.shape[0]
+	while nRowStart < nRows :
+		nRowEnd = int( numpy.searchsorted( arrayIndptr, arrayIndptr[nRowStart] + nMaxChunk, side='right' ) ) - 1
+		nRowEnd = min( max( nRowEnd, nRowStart + 1 ), nRows )
 
+		arrayStart = arrayIndptr[ nRowStart:nRowEnd ]
+		arrayLength = arrayIndptr[ nRowStart+1:nRowEnd+1 ] - arrayStart
+		arrayNonEmpty = numpy.nonzero( arrayLength )[0]
+		if len(arrayNonEmpty) > 0 :
+			arrayGathered = sketch[ matrix_adjacency.indices[ arrayIndptr[nRowStart] : arrayIndptr[nRowEnd] ] ]
+			arrayResult[ nRowStart + arrayNonEmpty ] = numpy.maximum.reduceat( arrayGathered, arrayStart[arrayNonEmpty] - arrayIndptr[nRowStart], axis=0 )
+
+		nRowStart = nRowEnd
+
+	return arrayResult
+
+def mix_sketch_hash( array_hash ):
+	"""
+	internal function to scramble 64 bit hashes (splitmix64 finalizer)
+
+	:param array_hash: numpy uint64 array
+	:return: numpy uint64 array
+	:rtype: numpy.ndarray
+	"""
+
+	import numpy
+
+	arrayHash = array_hash ^ ( array_hash >> numpy.uint64(30) )
+	arrayHash = arrayHash * numpy.uint64(0xBF58476D1CE4E5B9)
+	arrayHash = arrayHash ^ ( arrayHash >> numpy.uint64(27) )
+	arrayHash = arrayHash * numpy.uint64(0x94D049BB133111EB)
+	return arrayHash ^ ( arrayHash >> numpy.uint64(31) )
+
+def hash_to_sketch_register( array_hash, precision ):
+	"""
+	internal function to get the HLL register (top bits) and rank (leading zeros + 1 of the other bits) of 64 bit hashes
+
+	:param array_hash: numpy uint64 array
+	:param int precision: HLL precision
+	:return: register array, rank array
+	:rtype: numpy.ndarray, numpy.ndarray
+	"""
+
+	import numpy
+
+	nBits = 64 - precision
+	arrayRegister = ( array_hash >> numpy.uint64(nBits) ).astype( numpy.int64 )
+	arrayRest = array_hash & numpy.uint64( (1 << nBits) - 1 )
+
+	# bit length of the rest (frexp exponent), 0 if the rest is 0
+	arrayBitLength = numpy.frexp( arrayRest.astype( numpy.float64 ) )[1]
+	arrayBitLength = numpy.minimum( arrayBitLength, nBits )
+	arrayRank = ( nBits - arrayBitLength + 1 ).astype( numpy.uint8 )
+
+	return arrayRegister, arrayRank
+
+def count_sketch( sketch ):
+	"""
+	HyperLogLog estimate of the number of distinct items in a sketch
+
+	:param sketch: numpy array of registers
+	:return: estimated count
+	:rtype: int
+	"""
+
+	import numpy
+
+	nRegisters = len(sketch)
+	nZeros = int( numpy.count_nonzero( sketch == 0 ) )
+	if nZeros == nRegisters :
+		return 0
+
+	nAlpha = 0.7213 / ( 1.0 + 1.079 / nRegisters )
+	nEstimate = nAlpha * nRegisters * nRegisters / float( numpy.sum( numpy.power( 2.0, -sketch.astype( numpy.float64 ) ) ) )
+
+	# small range correction (linear counting)
+	if (nEstimate <= 2.5 * nRegisters) and (nZeros > 0) :
+		nEstimate = nRegisters * math.log( float(nRegisters) / nZeros )
+
+	return int( round( nEstimate ) )
 
 def generate_new_list( entity = None, entity_index = None, list_direction = None, ebunch = None ):
 	"""
@@ -905,4 +3272,197 @@ def aggregate_nodes_with_same_base( G, entity_index = None, root_node_list = Non
 	for strNode in queueNodes :
 		dictEdges = G[strNode]
 		if len(dictEdges) == 0 :
-			G.remove_node( strNode )
\ No newline at end of file
+			G.remove_node( strNode )
+
+def create_native_graph( ebunch = [] ):
+	"""
+	create a compact undirected graph for the steps between the graph walk and drawing (aggregation, categorization and max_nodes pruning), avoiding networkx per node and per edge attribute dicts.
+	nodes are integer ids (in the order they are added, like networkx), and each node has a dict of connected node id -> edge weight.
+	use native_graph_to_networkx() to convert the final (pruned) graph for drawing or export.
+
+	:param list ebunch: list of edges (entity1, entity2, weight) to add
+	:return: native graph { 'nodes' : list of entity (None if removed), 'node_id' : { entity : id }, 'adjacency' : list of { id : weight } (None if removed) }
+	:rtype: dict
+	"""
+
+	dictGraph = {
+		'nodes' : [],
+		'node_id' : {},
+		'adjacency' : [],
+		}
+
+	add_native_edges( dictGraph, ebunch )
+
+	return dictGraph
+
+def add_native_edges( graph, ebunch ):
+	"""
+	add edges to a native graph (adding nodes if they are missing). like networkx add_weighted_edges_from() an existing edge gets the new weight.
+
+	:param dict graph: native graph created by create_native_graph()
+	:param list ebunch: list of edges (entity1, entity2, weight)
+	"""
+
+	listNodes = graph['nodes']
+	dictNodeID = graph['node_id']
+	listAdjacency = graph['adjacency']
+
+	for ( strEntity1, strEntity2, nWeight ) in ebunch :
+		for strEntity in ( strEntity1, strEntity2 ) :
+			if not strEntity in dictNodeID :
+				dictNodeID[strEntity] = len(listNodes)
+				listNodes.append( strEntity )
+				listAdjacency.append( {} )
+
+		nID1 = dictNodeID[strEntity1]
+		nID2 = dictNodeID[strEntity2]
+		listAdjacency[nID1][nID2] = nWeight
+		listAdjacency[nID2][nID1] = nWeight
+
+def native_graph_nodes( graph ):
+	"""
+	get the entities in a native graph (in the order they were added)
+
+	:param dict graph: native graph created by create_native_graph()
+	:return: list of entities
+	:rtype: list
+	"""
+
+	listResult = []
+	for strEntity in graph['nodes'] :
+		if strEntity != None :
+			listResult.append( strEntity )
+	return listResult
+
+def native_weighted_degree( graph ):
+	"""
+	get the sum of edge weights of each node in a native graph (a self loop is counted once, like networkx)
+
+	:param dict graph: native graph created by create_native_graph()
+	:return: list of (entity, sum of edge weights) in node order
+	:rtype: list
+	"""
+
+	listResult = []
+	for nID in range( len( graph['nodes'] ) ) :
+		if graph['nodes'][nID] != None :
+			listResult.append( ( graph['nodes'][nID], sum( graph['adjacency'][nID].values() ) ) )
+	return listResult
+
+def prune_native_nodes( graph, list_entity ):
+	"""
+	remove nodes (and their edges) from a native graph
+
+	:param dict graph: native graph created by create_native_graph()
+	:param list list_entity: entities to remove
+	"""
+
+	listNodes = graph['nodes']
+	dictNodeID = graph['node_id']
+	listAdjacency = graph['adjacency']
+
+	setRemove = set([])
+	for strEntity in list_entity :
+		if strEntity in dictNodeID :
+			setRemove.add( dictNodeID[strEntity] )
+
+	for nID in setRemove :
+		for nIDConnected in listAdjacency[nID] :
+			if not nIDConnected in setRemove :
+				del listAdjacency[nIDConnected][nID]
+
+	for nID in setRemove :
+		del dictNodeID[ listNodes[nID] ]
+		listNodes[nID] = None
+		listAdjacency[nID] = None
+
+def aggregate_native_nodes( graph, root_node_list = None, filter_post_freq = None ):
+	"""
+	aggregate nodes of a native graph with the same name but different posts (e.g. mention_post1 + mention_post2 -> mention).
+	this gives the same graph and edge weights as aggregate_nodes_with_same_base() does for a networkx graph, but nodes are grouped by base name in a single pass
+	and each node merge only visits the edges of the merged node (not the whole graph).
+
+	:param dict graph: native graph created by create_native_graph()
+	:param root_node_list: list of root nodes
+	:param filter_post_freq: minimum post frequency allowed (can be None to disable post freq filtering)
+	"""
+
+	listNodes = graph['nodes']
+	listAdjacency = graph['adjacency']
+
+	# group nodes by base name (nodes with the same base are in node order, bases in the same order as aggregate_nodes_with_same_base())
+	setBaseNames = set([])
+	dictBaseNodes = {}
+	for nID in range( len(listNodes) ) :
+		if listNodes[nID] == None :
+			continue
+		strBase = listNodes[nID].split('@@@')[0]
+		setBaseNames.add( strBase )
+		if not strBase in dictBaseNodes :
+			dictBaseNodes[strBase] = []
+		dictBaseNodes[strBase].append( nID )
+
+	for strBase in setBaseNames :
+
+		listMatch = dictBaseNodes[strBase]
+		nIDToKeep = listMatch[0]
+
+		# if this post node is below threshold then remove it entirely
+		if filter_post_freq != None :
+			if listNodes[nIDToKeep].startswith('posts[') :
+				if len(listMatch) < filter_post_freq :
+					prune_native_nodes( graph, [ listNodes[nID] for nID in listMatch ] )
+					continue
+
+		# relocate the edges of each node to remove onto the node to keep. as in aggregate_nodes_with_same_base() a relocated edge adds twice its weight
+		# (once as a child edge and once as a parent edge), and an edge to the node to keep becomes a self loop.
+		# a self loop on the node to remove also becomes a self loop on the node to keep (aggregate_nodes_with_same_base() fails on these, or gives a weight that depends on edge order)
+		dictEdgesToKeep = listAdjacency[nIDToKeep]
+		for nIDToRemove in listMatch[1:] :
+			# read a copy of the edges, as the adjacency dicts are updated in the loop
+			for ( nIDChild, nWeight ) in list( listAdjacency[nIDToRemove].items() ) :
+				if (nIDChild == nIDToKeep) or (nIDChild == nIDToRemove) :
+					dictEdgesToKeep[nIDToKeep] = dictEdgesToKeep.get( nIDToKeep, 0 ) + 2 * nWeight
+				else :
+					dictEdgesToKeep[nIDChild] = dictEdgesToKeep.get( nIDChild, 0 ) + 2 * nWeight
+					listAdjacency[nIDChild][nIDToKeep] = dictEdgesToKeep[nIDChild]
+
+			prune_native_nodes( graph, [ listNodes[nIDToRemove] ] )
+
+	# remove any nodes that are now widows
+	listWidows = []
+	for nID in range( len(listNodes) ) :
+		if (listNodes[nID] != None) and (len( listAdjacency[nID] ) == 0) :
+			listWidows.append( listNodes[nID] )
+	prune_native_nodes( graph, listWidows )
+
+def native_graph_to_networkx( graph, dict_node_attributes = {} ):
+	"""
+	convert a native graph to a networkx graph (nodes in the same order, edges with a weight attribute)
+
+	:param dict graph: native graph created by create_native_graph()
+	:param dict dict_node_attributes: dict of entity -> node attribute dict
+	:return: graph
+	:rtype: networkx.Graph
+	"""
+
+	import networkx as nx
+
+	listNodes = graph['nodes']
+	listAdjacency = graph['adjacency']
+
+	listNodeData = []
+	listEBunch = []
+	for nID in range( len(listNodes) ) :
+		if listNodes[nID] == None :
+			continue
+		listNodeData.append( ( listNodes[nID], dict_node_attributes.get( listNodes[nID], {} ) ) )
+		for ( nIDConnected, nWeight ) in listAdjacency[nID].items() :
+			if nIDConnected >= nID :
+				listEBunch.append( ( listNodes[nID], listNodes[nIDConnected], nWeight ) )
+
+	G = nx.Graph()
+	G.add_nodes_from( listNodeData )
+	G.add_weighted_edges_from( listEBunch, weight='weight' )
+
+	return G